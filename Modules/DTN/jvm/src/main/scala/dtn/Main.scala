@@ -34,6 +34,7 @@ commandline options:
   -ma  => monitoring address                                         | default: 127.0.0.1
   -mp  => monitoring port                                            | default: 5000
   -mid => monitoring creation client id                              | default: dtn://n2/rdt/testapp
+  -md  => monitoring directory (for monitoring)                      | default: /shared/monitoring
   -awa => add-wins rdt number of additions                           | default: 1000
   -awt => add-wins rdt sleep time milliseconds                       | default: 500
   -rrn => rdt-router (and random-router) n total nodes to deliver to | default: 10
@@ -54,6 +55,7 @@ commandline options:
       val monitoring_address: String                 = keyword_args.getOrElse("-ma", "127.0.0.1")
       val monitoring_port: Int                       = keyword_args.getOrElse("-mp", "5000").toInt
       val creation_client_id: String                 = keyword_args.getOrElse("-mid", "dtn://n2/rdt/testapp")
+      val monitoring_dir: String                     = keyword_args.getOrElse("-md", "/shared/monitoring")
       val add_wins_rdt_number_of_additions: Int      = keyword_args.getOrElse("-awa", "1000").toInt
       val add_wins_rdt_sleep_time_milliseconds: Long = keyword_args.getOrElse("-awt", "500").toLong
       val routing_strategy: String                   = keyword_args.getOrElse("-rs", "epidemic")
@@ -63,7 +65,7 @@ commandline options:
       val rdt_router_top_n_neighbours                = keyword_args.getOrElse("-rrt", "3").toInt
 
       method match
-        case "monitoring" => start_monitoring_server(host_address, host_port)
+        case "monitoring" => start_monitoring_server(host_address, host_port, MonitoringPaths(monitoring_dir))
         case "routing" => {
           _route_forever(
             routing_strategy match
@@ -186,8 +188,12 @@ commandline options:
 
 // all helper methods
 
-def start_monitoring_server(interface_address: String, port: Int): Unit = {
-  val monitoring_server = MonitoringServer(interface_address, port)
+def start_monitoring_server(
+    interface_address: String,
+    port: Int,
+    paths: MonitoringPaths = MonitoringPaths()
+): Unit = {
+  val monitoring_server = MonitoringServer(interface_address, port, paths)
   monitoring_server.run()
 }
 
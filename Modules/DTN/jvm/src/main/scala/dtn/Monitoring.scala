@@ -27,7 +27,7 @@ class MonitoringPaths(base_dir: String = "/shared/monitoring") {
 
 class MonitoringServer(server: TCPReadonlyServer, paths: MonitoringPaths = MonitoringPaths()) {
   def run(): Unit = {
-    val dir = Paths.get("/shared/monitoring")
+    Files.createDirectories(paths.monitoring_dir)
 
     Using.Manager { use =>
       val streamReceived  = use(BufferedOutputStream(Files.newOutputStream(paths.received_data_fp)))
@@ -73,11 +73,11 @@ class MonitoringServer(server: TCPReadonlyServer, paths: MonitoringPaths = Monit
   }
 }
 object MonitoringServer {
-  def apply(interface: String, port: Int): MonitoringServer = {
+  def apply(interface: String, port: Int, paths: MonitoringPaths = MonitoringPaths()): MonitoringServer = {
     val server = TCPReadonlyServer(interface, port)
     server.start()
-    println(s"monitoring server started under $interface:$port")
-    new MonitoringServer(server)
+    println(s"monitoring server started under $interface:$port, writing to ${paths.monitoring_dir}")
+    new MonitoringServer(server, paths)
   }
 }
 
@@ -1,7 +1,7 @@
 """
 Simple example custom service, used to drive shell commands on a node.
 """
-from typing import Tuple
+from typing import Dict, List, Tuple
 
 from core.nodes.base import CoreNode
 from core.services.coreservices import CoreService, ServiceMode
@@ -33,6 +33,7 @@ class DtndService(CoreService):
     :cvar validation_period: period in seconds to wait before retrying validation,
         only used in NON_BLOCKING mode
     :cvar shutdown: shutdown commands to stop this service
+    :cvar config_defaults: dtnd.toml settings, each can be overridden by the session metadata key "dtnd.<setting>"
     """
 
     name: str = "dtnd"
@@ -43,11 +44,28 @@ class DtndService(CoreService):
     configs: Tuple[str, ...] = ('dtnd.toml', 'start-dtnd.sh')
     startup: Tuple[str, ...] = (
         "bash -c 'dtnd -d -c dtnd.toml &> dtnd.log'", )
-    validate: Tuple[str, ...] = ()
+    # ready once the http api answers, the services that depend on dtnd are only started after that
+    validate: Tuple[str, ...] = (
+        "curl -sf -o /dev/null http://127.0.0.1:3000/status/nodeid", )
     validation_mode: ServiceMode = ServiceMode.NON_BLOCKING
-    validation_timer: int = 5
-    validation_period: float = 0.5
-    shutdown: Tuple[str, ...] = ()
+    validation_timer: int = 30
+    validation_period: float = 0.2
+    # stops only the processes of this node, they are the ones running in the node directory,
+    # a process that has not exited 5 seconds after SIGTERM is killed
+    shutdown: Tuple[str, ...] = (
+        "bash -c 'for pid in $(pgrep -x dtnd); do [ \"$(readlink /proc/$pid/cwd)\" = \"$PWD\" ] && { kill $pid; for attempt in $(seq 50); do grep -qs \"^State:[[:space:]]*[^Z]\" /proc/$pid/status || continue 2; sleep 0.1; done; kill -9 $pid; }; done; true'", )
+    # besides these, the session metadata can hold per node lists (comma separated), keyed by the node name:
+    #  dtnd.discovery_destinations.<node name>  addresses the node sends its discovery beacons to (default: the multicast targets)
+    #  dtnd.peers.<node name>                   static peers of the node, e.g. "mtcp://10.0.0.2:16163/n2"
+    config_defaults = {
+        "cla": "mtcp",
+        "cla_port": "16163",
+        "routing_strategy": "epidemic",
+        "janitor_interval": "10s",
+        "discovery_interval": "2s",
+        "peer_timeout": "20s",
+        "db": "mem",
+    }
 
     @classmethod
     def on_load(cls) -> None:
@@ -71,6 +89,28 @@ class DtndService(CoreService):
         """
         return cls.configs
 
+    @classmethod
+    def get_config_settings(cls, node: CoreNode) -> Dict[str, str]:
+        """
+        Collects the dtnd.toml settings of a node from the session metadata, so a whole
+        session can be configured without uploading a config file per node.
+
+        :param node: core node that the service is being ran on
+        :return: config_defaults overridden by the "dtnd.<setting>" metadata entries
+        """
+        metadata = node.session.metadata
+        return {setting: metadata.get(f"dtnd.{setting}", default) for setting, default in cls.config_defaults.items()}
+
+    @classmethod
+    def get_node_list(cls, node: CoreNode, name: str) -> List[str]:
+        """
+        :param node: core node that the service is being ran on
+        :param name: list name, e.g. "discovery_destinations"
+        :return: the entries of the "dtnd.<name>.<node name>" metadata entry
+        """
+        entries = node.session.metadata.get(f"dtnd.{name}.{node.name}", "")
+        return [entry for entry in entries.split(",") if entry]
+
     @classmethod
     def generate_config(cls, node: CoreNode, filename: str) -> str:
         """
@@ -82,6 +122,29 @@ class DtndService(CoreService):
         :param filename: configuration file to generate
         :return: configuration file content
         """
+        settings = cls.get_config_settings(node)
+
+        discovery_destinations = cls.get_node_list(node, "discovery_destinations")
+        if discovery_destinations:
+            discovery_destinations_section = "[discovery_destinations]\n" + "".join(
+                f'target.{idx}.destination = "{destination}"\n' for idx, destination in enumerate(discovery_destinations))
+        else:
+            discovery_destinations_section = """# [discovery_destinations]
+#
+# target.0.destination = "224.0.0.27:3004"
+#
+# target.1.destination = "[FF02::1]:3004"
+"""
+
+        peers = cls.get_node_list(node, "peers")
+        if peers:
+            peers_section = "peers = [\n" + "".join(f'    "{peer}",\n' for peer in peers) + "]\n"
+        else:
+            peers_section = """#peers = [
+#    "mtcp://192.168.2.101/testnode",    
+#]
+"""
+
         dtnd_config = f"""
 # Example config file for dtn7 daemon
 debug = false
@@ -95,36 +158,31 @@ webport = 3000
 
 workdir = "."
 
-db = "mem"
+db = "{settings['db']}"
 
 [routing]
-strategy = "epidemic"
+strategy = "{settings['routing_strategy']}"
 
 [core]
 # the janitor is responsible for cleaning the bundle buffer
 # and schedule resubmissions.
 # a value of 0 deactives the janitor
-janitor = "10s"
+janitor = "{settings['janitor_interval']}"
 
 
 [discovery]
 # interval of 0 deactives discovery service
-interval = "2s"
-peer-timeout = "20s"
+interval = "{settings['discovery_interval']}"
+peer-timeout = "{settings['peer_timeout']}"
 
 [convergencylayers]
 
-cla.0.id = "mtcp"
-cla.0.port = 16163
+cla.0.id = "{settings['cla']}"
+cla.0.port = {settings['cla_port']}
 
 # Define user specified discovery targets to send announcement beacons to, if not specified the default targets "224.0.0.26:3003" for IPv4 and "[FF02::1]:3003" will be used
 # If a IPv4 address is specified the IPv4 flag has to be enabled, same goes for specifying an IPv6 address
-# [discovery_destinations]
-#
-# target.0.destination = "224.0.0.27:3004"
-#
-# target.1.destination = "[FF02::1]:3004"
-
+{discovery_destinations_section}
 
 # Define user specified services that will be advertised with discovery beacons
 # Each service takes a u8 tag and a payload value who's content depends on the used tag
@@ -148,10 +206,7 @@ cla.0.port = 16163
 # service.3.payload = "Samplestreet 42 12345 SampleCity SC"
 
 [statics]
-#peers = [
-#    "mtcp://192.168.2.101/testnode",    
-#]
-
+{peers_section}
 [endpoints]
 # local endpoints are always reachable under dtn://<nodeid>/<localname>
 #local.0 = "incoming"
@@ -173,9 +228,16 @@ cla.0.port = 16163
         if not needed.
 
         :param node: core node that the service is being ran on
-        :return: tuple of startup commands to run
+        :return: tuple of startup commands to run, with "limits.cpu_weight" or "limits.memory_max"
+            in the session metadata dtnd runs in the cgroup of the node (see scripts/dtn7-node-limits)
         """
         #cmd = f"bash start-dnd.sh"
+        metadata = node.session.metadata
+
+        if "limits.cpu_weight" in metadata or "limits.memory_max" in metadata:
+            limited_dtnd = f"dtn7-node-limits {metadata.get('limits.cpu_weight', '-')} {metadata.get('limits.memory_max', '-')} dtnd"
+            return tuple(startup.replace("dtnd -d", f"{limited_dtnd} -d", 1) for startup in cls.startup)
+
         return cls.startup
 
     @classmethod
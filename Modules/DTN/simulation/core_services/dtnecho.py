@@ -42,7 +42,7 @@ class DtnEchoService(CoreService):
     dirs: Tuple[str, ...] = ()
     configs: Tuple[str, ...] = ()
     startup: Tuple[str, ...] = (
-        "bash -c 'sleep 2 && dtnecho2 &> dtnecho.log'", )
+        "bash -c 'dtnecho2 &> dtnecho.log'", )
     validate: Tuple[str, ...] = ()
     validation_mode: ServiceMode = ServiceMode.NON_BLOCKING
     validation_timer: int = 5
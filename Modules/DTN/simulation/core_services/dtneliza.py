@@ -42,7 +42,7 @@ class DtnElizaService(CoreService):
     dirs: Tuple[str, ...] = ()
     configs: Tuple[str, ...] = ()
     startup: Tuple[str, ...] = (
-        "bash -c 'sleep 2 && dtneliza &> dtneliza.log'", )
+        "bash -c 'dtneliza &> dtneliza.log'", )
     validate: Tuple[str, ...] = ()
     validation_mode: ServiceMode = ServiceMode.NON_BLOCKING
     validation_timer: int = 5
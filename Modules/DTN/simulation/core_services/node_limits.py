@@ -0,0 +1,26 @@
+"""
+Resource limits of the rdt_tool processes of a node, shared by the rdtclient, rdtrouter and
+rdtmonitoring services and by the startup commands "run-dgs.py" sets for them.
+
+The limits are session metadata entries (written by "run-dgs.py"):
+ limits.cpu_weight, limits.memory_max  run rdt_tool in the cgroup of its node (see scripts/dtn7-node-limits)
+ limits.rdt_tool_max_heap              caps the java heap of rdt_tool
+"""
+from typing import Mapping
+
+rdt_tool: str = "/root/.coregui/scripts/rdt_tool"
+
+
+def get_limited_rdt_tool(metadata: Mapping[str, str]) -> str:
+    """
+    :param metadata: session metadata, only its "limits.*" entries are used
+    :return: the rdt_tool command with the limits applied, rdt_tool itself without any
+    """
+    limited_rdt_tool = rdt_tool
+
+    if "limits.rdt_tool_max_heap" in metadata:
+        limited_rdt_tool += f" -Xmx{metadata['limits.rdt_tool_max_heap']}"
+    if "limits.cpu_weight" in metadata or "limits.memory_max" in metadata:
+        limited_rdt_tool = f"dtn7-node-limits {metadata.get('limits.cpu_weight', '-')} {metadata.get('limits.memory_max', '-')} {limited_rdt_tool}"
+
+    return limited_rdt_tool
@@ -6,6 +6,8 @@ from typing import Tuple
 from core.nodes.base import CoreNode
 from core.services.coreservices import CoreService, ServiceMode
 
+from .node_limits import get_limited_rdt_tool, rdt_tool
+
 
 class RdtCheckerService(CoreService):
     """
@@ -43,11 +45,16 @@ class RdtCheckerService(CoreService):
     configs: Tuple[str, ...] = ()
     startup: Tuple[str, ...] = (
         "bash -c '/root/.coregui/scripts/rdt_tool -m monitoring &> monitoring.log'", )
-    validate: Tuple[str, ...] = ()
+    # ready once the monitoring server listens on port 5000 (0x1388), checked without connecting to it
+    validate: Tuple[str, ...] = (
+        "bash -c 'grep -qs \":1388 [0-9A-F]*:0000 0A \" /proc/net/tcp /proc/net/tcp6'", )
     validation_mode: ServiceMode = ServiceMode.NON_BLOCKING
-    validation_timer: int = 5
-    validation_period: float = 0.5
-    shutdown: Tuple[str, ...] = ()
+    validation_timer: int = 30
+    validation_period: float = 0.2
+    # stops only the processes of this node, they are the ones running in the node directory,
+    # a process that has not exited 5 seconds after SIGTERM is killed
+    shutdown: Tuple[str, ...] = (
+        "bash -c 'for pid in $(pgrep -f \"[r]dt_tool .*-m monitoring\"); do [ \"$(readlink /proc/$pid/cwd)\" = \"$PWD\" ] && { kill $pid; for attempt in $(seq 50); do grep -qs \"^State:[[:space:]]*[^Z]\" /proc/$pid/status || continue 2; sleep 0.1; done; kill -9 $pid; }; done; true'", )
 
     @classmethod
     def on_load(cls) -> None:
@@ -92,9 +99,12 @@ class RdtCheckerService(CoreService):
         if not needed.
 
         :param node: core node that the service is being ran on
-        :return: tuple of startup commands to run
+        :return: tuple of startup commands to run, with the resource limits of the session
+            metadata applied: "limits.cpu_weight" and "limits.memory_max" run rdt_tool in the
+            cgroup of the node (see scripts/dtn7-node-limits), "limits.rdt_tool_max_heap" caps its heap
         """
-        return cls.startup
+        limited_rdt_tool = get_limited_rdt_tool(node.session.metadata)
+        return tuple(startup.replace(rdt_tool, limited_rdt_tool, 1) for startup in cls.startup)
 
     @classmethod
     def get_validate(cls, node: CoreNode) -> Tuple[str, ...]:
@@ -1,4 +1,6 @@
 #!/usr/bin/env python3
+import bisect
+import heapq
 import pathlib
 import os
 
@@ -8,6 +10,11 @@ this_filepath = pathlib.Path(__file__).parent.resolve()
 contacts_filepath = this_filepath / "data" / "Exp1" / "contacts.Exp1.dat"
 dgs_filepath = this_filepath / "data" / "dgs" / "exp1.dgs"
 
+# streaming mode: reads the contacts line by line and writes each step as soon as it is final,
+# memory is then proportional to the currently open contacts instead of the whole trace
+# requires the input file to be sorted by start time, e.g.: sort -t$'\t' -k3,3n contacts.Exp1.dat
+streaming = False
+
 if not os.path.exists(dgs_filepath.parent):
   os.makedirs(dgs_filepath.parent)
 
@@ -43,100 +50,189 @@ dgs_file.write("contacts 0 0\n")  # unique-graph-name number-of-steps number-of-
 #  For a data transfer the discovering node would contact the discovered node.
 
 # temporary data structure
-#  each second is a step
-#  structure: step -> list(actions)
-#  for each contact we put an "ae" and "de" at the respective timestamp-steps
-#  many contact have the same begin-time and end-time, for these, we add a random number between 1 and 20 to the end-time
-#  for each "ae" check if there is a previous "ae" without a following "de", then don't add it
-#  for each "de" check if there is a previous "de" without a following "ae", then remove the "de" and at this "de"
-steps = {}
-nodes = set()
+#  for each (undirected) node pair we keep a sorted list of merged contact intervals [start-time, end-time]
+#  many contacts have the same begin-time and end-time, for these, we add 10 seconds to the end-time
+#  a new contact is merged with every interval of its pair it overlaps or touches (found via binary search)
+#  overlapping contacts and sightings recorded by both devices therefore collapse into a single interval
+#  each interval results in one "ae" at its start-time-step and one "de" at its end-time-step
+class Contact_Intervals:
 
-print("reading input file")
+  def __init__(self) -> None:
+    self.starts = []
+    self.ends = []
 
-with open(contacts_filepath, "rt", encoding="utf8") as f:
-  input_data = f.read()
+  def add(self, start_time, end_time):
+    # intervals are disjoint and sorted, so both lists are sorted and [first, last) are all intervals touching the new one
+    first = bisect.bisect_left(self.ends, start_time)
+    last = bisect.bisect_right(self.starts, end_time)
 
+    if first < last:
+      start_time = min(start_time, self.starts[first])
+      end_time = max(end_time, self.ends[last-1])
 
-def should_append_add_edge(add_edge, delete_edge, start_time):
-  for i in reversed(range(0, start_time)):
-    for event in steps.get(i, []):
-      if event == delete_edge:  # early return if we found a previous delete-edge we can safely append a new add-edge
-        return True
-      if event == add_edge:  # if we found a previous add-edge without a trailing delete-edge, then do not append this add-edge
-        return False
-  return True  # nothing found, then we can safely append the add-adge
+    self.starts[first:last] = [start_time]
+    self.ends[first:last] = [end_time]
 
+  def __iter__(self):
+    return zip(self.starts, self.ends)
 
-def remove_inbetween_delete_edge(add_edge, delete_edge, end_time):
-  for i in reversed(range(0, end_time)):
-    for ei, event in enumerate(steps.get(i, [])):
-      if event == delete_edge:  # if we found a previous delete-edge, remove it and the new end will be this delete-edge
-        del steps[i][ei]
-        return
-      if event == add_edge:  # early return, if we found a previous add-edge, we can safely append this delete-edge
-        return
-  raise Exception(f"there should be no delete-edge {delete_edge} without a previous add-edge {add_edge}")
 
+class ID_Counter:
 
-edge_counter = 0
-def get_unique_edge_name():
-  global edge_counter
-  unique_edge_name = f"e{edge_counter}"
-  edge_counter += 1
-  return unique_edge_name
+  def __init__(self, init=0) -> None:
+    self.counter = init-1
 
+  def next(self) -> int:
+    self.counter += 1
+    return self.counter
 
-print("adding edges to temp structure")
 
-for line in input_data.splitlines():
-  device_id, seen_id, start_time, end_time, *others = line.split(u"\u0009")
+class Dgs_Writer:
 
-  device_id, seen_id, start_time, end_time = int(device_id), int(seen_id), int(start_time), int(end_time)
+  def __init__(self, file) -> None:
+    self.file = file
+    self.edge_counter = ID_Counter(0)
+    self.latest_unique_edge_names = {}
 
-  nodes.add(device_id)
-  nodes.add(seen_id)
+  def write_nodes(self, nodes):
+    self.file.write("st 0\n")
+    for i in nodes:
+      self.file.write(f"an n{i}\n")
 
-  if (start_time == end_time):
-    end_time += 10
+  def write_step(self, step, events):
+    self.file.write(f"st {step}\n")
 
-  add_edge = ("ae", min(device_id, seen_id), max(device_id, seen_id))
-  delete_edge = ("de", min(device_id, seen_id), max(device_id, seen_id))
+    for event in sorted(events):
+      node_pair = (event[1], event[2])
 
-  if should_append_add_edge(add_edge, delete_edge, start_time):
-    lst: list = steps.get(start_time, [])
-    lst.append(add_edge)
-    steps[start_time] = lst
-  
-  remove_inbetween_delete_edge(add_edge, delete_edge, end_time)
+      if event[0] == "ae":
+        unique_edge_name = f"e{self.edge_counter.next()}"
+        self.latest_unique_edge_names[node_pair] = unique_edge_name
+        self.file.write(f"{event[0]} {unique_edge_name} n{event[1]} n{event[2]}\n")
+      elif event[0] == "de":
+        unique_edge_name = self.latest_unique_edge_names.pop(node_pair)
+        self.file.write(f"{event[0]} {unique_edge_name}\n")
 
-  lst: list = steps.get(end_time, [])
-  lst.append(delete_edge)
-  steps[end_time] = lst
 
+def read_contacts(file):
+  for line in file:
+    if line.strip() == "":
+      continue
 
-print("writing nodes to dgs file")
+    device_id, seen_id, start_time, end_time, *others = line.split(u"\u0009")
 
-dgs_file.write("st 0\n")
-for i in nodes:
-  dgs_file.write(f"an n{i}\n")
+    device_id, seen_id, start_time, end_time = int(device_id), int(seen_id), int(start_time), int(end_time)
 
+    if (start_time == end_time):
+      end_time += 10
 
-print("writing data to dgs file")
+    yield device_id, seen_id, start_time, end_time
 
-latest_unique_edge_names = {}
 
-for i in sorted(steps.keys()):
-  dgs_file.write(f"st {i}\n")
+def convert_in_memory(dgs_writer):
+  contact_intervals = {}
+  nodes = set()
 
-  for event in steps[i]:
-    if event[0] == "ae":
-      unique_edge_name = get_unique_edge_name()
-      latest_unique_edge_names[event] = unique_edge_name
-      dgs_file.write(f"{event[0]} {unique_edge_name} n{event[1]} n{event[2]}\n")
-    elif event[0] == "de":
-      unique_edge_name = latest_unique_edge_names[("ae", event[1], event[2])]
-      dgs_file.write(f"{event[0]} {unique_edge_name}\n")
+  print("adding contacts to temp structure")
 
-dgs_file.close()
+  with open(contacts_filepath, "rt", encoding="utf8") as f:
+    for device_id, seen_id, start_time, end_time in read_contacts(f):
+      nodes.add(device_id)
+      nodes.add(seen_id)
+
+      node_pair = (min(device_id, seen_id), max(device_id, seen_id))
+
+      if node_pair not in contact_intervals:
+        contact_intervals[node_pair] = Contact_Intervals()
+      contact_intervals[node_pair].add(start_time, end_time)
+
+  print("converting contacts to steps")
+
+  steps = {}  # structure: step -> list(actions)
+
+  for node_pair, intervals in contact_intervals.items():
+    for start_time, end_time in intervals:
+      steps.setdefault(start_time, []).append(("ae", *node_pair))
+      steps.setdefault(end_time, []).append(("de", *node_pair))
+
+  print("writing nodes to dgs file")
+  dgs_writer.write_nodes(nodes)
+
+  print("writing data to dgs file")
+  for i in sorted(steps.keys()):
+    dgs_writer.write_step(i, steps[i])
+
+
+# streaming structure
+#  with contacts sorted by start time, no later contact can touch a step before the current start time
+#  open_contacts: node pair -> [start-time, end-time] of the single interval per pair that may still grow
+#  closing_times: heap of (end-time, node pair), entries of intervals that grew afterwards are skipped
+#  pending_steps: step -> list(actions), only steps at or after the start time of the oldest open contact
+def convert_streaming(dgs_writer):
+  print("collecting nodes from input file")
+
+  nodes = set()
+  with open(contacts_filepath, "rt", encoding="utf8") as f:
+    for device_id, seen_id, start_time, end_time in read_contacts(f):
+      nodes.add(device_id)
+      nodes.add(seen_id)
+
+  print("writing nodes to dgs file")
+  dgs_writer.write_nodes(nodes)
+
+  open_contacts = {}
+  closing_times = []
+  pending_steps = {}
+  pending_step_numbers = []
 
+  def add_pending_event(step, event):
+    if step not in pending_steps:
+      pending_steps[step] = []
+      heapq.heappush(pending_step_numbers, step)
+    pending_steps[step].append(event)
+
+  def advance(current_time):
+    while closing_times and closing_times[0][0] < current_time:
+      end_time, node_pair = heapq.heappop(closing_times)
+      if node_pair in open_contacts and open_contacts[node_pair][1] == end_time:
+        del open_contacts[node_pair]
+        add_pending_event(end_time, ("de", *node_pair))
+
+    while pending_step_numbers and pending_step_numbers[0] < current_time:
+      step = heapq.heappop(pending_step_numbers)
+      dgs_writer.write_step(step, pending_steps.pop(step))
+
+  print("streaming contacts to dgs file")
+
+  current_time = 0
+  with open(contacts_filepath, "rt", encoding="utf8") as f:
+    for device_id, seen_id, start_time, end_time in read_contacts(f):
+      if start_time < current_time:
+        raise Exception(f"contact starting at {start_time} follows a contact starting at {current_time}, streaming requires the input to be sorted by start time")
+
+      if start_time > current_time:
+        current_time = start_time
+        advance(current_time)
+
+      node_pair = (min(device_id, seen_id), max(device_id, seen_id))
+
+      if node_pair in open_contacts:  # every still open interval ends at or after the current start time, so they touch
+        if end_time > open_contacts[node_pair][1]:
+          open_contacts[node_pair][1] = end_time
+          heapq.heappush(closing_times, (end_time, node_pair))
+      else:
+        open_contacts[node_pair] = [start_time, end_time]
+        heapq.heappush(closing_times, (end_time, node_pair))
+        add_pending_event(start_time, ("ae", *node_pair))
+
+  advance(float("inf"))
+
+
+dgs_writer = Dgs_Writer(dgs_file)
+
+if streaming:
+  convert_streaming(dgs_writer)
+else:
+  convert_in_memory(dgs_writer)
+
+dgs_file.close()
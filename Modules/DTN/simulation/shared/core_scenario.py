@@ -0,0 +1,175 @@
+"""
+compiled session descriptions for "run-dgs.py"
+
+a CoreScenario collects everything the setup phase would otherwise send one grpc call at a time
+ - nodes with their services
+ - per-node service startups and service files
+ - links with their interfaces and initial link options
+ - session options (e.g. the control network) and session metadata (e.g. the dtnd.toml settings, see "core_services/dtnd.py")
+and writes it as a CORE xml scenario (the same format as the files in "basic_scenarios"), which is loaded with a single open_xml call
+
+the replay phase gets a compact link toggle schedule next to it:
+ per replayed step, (action, link-name, node_min_id, node_max_id) with the node names already resolved to node ids
+
+usage:
+ scenario = CoreScenario("exp1")
+ scenario.add_node(2, "n1", "DTN", Position(x=100, y=100), ["dtnd"])
+ scenario.set_session_metadata({"dtnd.cla": "udp"})
+ scenario.add_link(2, 3, node1_iface, node2_iface, loss=100)
+ scenario.write(scenario_filepath)
+ save_link_toggles(toggles_filepath, compile_link_toggles(replay_plan.schedule, node_map))
+"""
+import json
+import os
+import pathlib
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Tuple
+
+
+TOGGLES_VERSION = 1
+
+LinkToggles = List[Tuple[int, List[Tuple[str, str, int, int]]]]  # (step-number, [(action, link-name, node_min_id, node_max_id)])
+
+
+class CoreScenario:
+
+  def __init__(self, name) -> None:
+    self.name = name
+    self.nodes = []  # (node_id, node_name, model, position, services)
+    self.service_startups: Dict[Tuple[int, str], Tuple[str, ...]] = {}
+    self.service_files: Dict[Tuple[int, str], Dict[str, str]] = {}
+    self.links = []  # (node1_id, node2_id, node1_iface, node2_iface, loss)
+    self.session_options: Dict[str, str] = {}
+    self.session_metadata: Dict[str, str] = {}
+
+  def add_node(self, node_id, node_name, model, position, services) -> None:
+    self.nodes.append((node_id, node_name, model, position, list(services)))
+
+  def set_service_startup(self, node_id, service_name, startup) -> None:
+    self.service_startups[(node_id, service_name)] = tuple(startup)
+
+  def add_service_file(self, node_id, service_name, filename, file_contents) -> None:
+    self.service_files.setdefault((node_id, service_name), {})[filename] = file_contents
+
+  def add_link(self, node1_id, node2_id, node1_iface, node2_iface, loss=100) -> None:
+    self.links.append((node1_id, node2_id, node1_iface, node2_iface, loss))
+
+  def set_session_option(self, name, value) -> None:
+    self.session_options[name] = value
+
+  def set_session_metadata(self, metadata: Dict[str, str]) -> None:
+    self.session_metadata.update(metadata)
+
+  def _devices_element(self) -> ET.Element:
+    devices = ET.Element("devices")
+
+    for node_id, node_name, model, position, services in self.nodes:
+      device = ET.SubElement(devices, "device", id=str(node_id), name=node_name, icon="", canvas="0", type=model, attrib={"class": ""}, image="")
+      ET.SubElement(device, "position", x=str(float(position.x)), y=str(float(position.y)))
+      services_element = ET.SubElement(device, "services")
+      for service_name in services:
+        ET.SubElement(services_element, "service", name=service_name)
+
+    return devices
+
+  def _links_element(self) -> ET.Element:
+    links = ET.Element("links")
+
+    for node1_id, node2_id, node1_iface, node2_iface, loss in self.links:
+      link = ET.SubElement(links, "link", node1=str(node1_id), node2=str(node2_id))
+      for tag, iface in (("iface1", node1_iface), ("iface2", node2_iface)):
+        ET.SubElement(link, tag, id=str(iface.id), name=f"eth{iface.id}", mac=iface.mac, ip4=iface.ip4, ip4_mask=str(iface.ip4_mask))
+      ET.SubElement(link, "options", loss=str(float(loss)))
+
+    return links
+
+  def _service_configurations_element(self) -> ET.Element:
+    service_configurations = ET.Element("service_configurations")
+
+    for node_id, service_name in sorted({*self.service_startups, *self.service_files}):
+      service = ET.SubElement(service_configurations, "service", name=service_name, node=str(node_id))
+
+      if (node_id, service_name) in self.service_startups:
+        startups = ET.SubElement(service, "startups")
+        for startup in self.service_startups[(node_id, service_name)]:
+          ET.SubElement(startups, "startup").text = startup
+
+      if (node_id, service_name) in self.service_files:
+        files = ET.SubElement(service, "files")
+        for filename, file_contents in self.service_files[(node_id, service_name)].items():
+          ET.SubElement(files, "file", name=filename).text = file_contents
+
+    return service_configurations
+
+  def _session_options_element(self) -> ET.Element:
+    session_options = ET.Element("session_options")
+
+    for name, value in self.session_options.items():
+      ET.SubElement(session_options, "configuration", name=name, value=value)
+
+    return session_options
+
+  def _session_metadata_element(self) -> ET.Element:
+    session_metadata = ET.Element("session_metadata")
+
+    for name, value in self.session_metadata.items():
+      ET.SubElement(session_metadata, "configuration", name=name, value=value)
+
+    return session_metadata
+
+  def write(self, scenario_filepath) -> None:
+    scenario = ET.Element("scenario", name=self.name)
+    scenario.append(self._devices_element())
+    scenario.append(self._links_element())
+    scenario.append(self._service_configurations_element())
+    scenario.append(self._session_options_element())
+    scenario.append(self._session_metadata_element())
+
+    tree = ET.ElementTree(scenario)
+    ET.indent(tree, space="  ")
+
+    scenario_filepath = pathlib.Path(scenario_filepath)
+    scenario_filepath.parent.mkdir(parents=True, exist_ok=True)
+    temporary_scenario_filepath = scenario_filepath.with_name(f"{scenario_filepath.name}.{os.getpid()}.tmp")
+
+    tree.write(temporary_scenario_filepath, encoding="UTF-8", xml_declaration=True)
+    temporary_scenario_filepath.replace(scenario_filepath)  # atomic, runs started at the same time never load a half written scenario
+
+
+def compile_link_toggles(schedule, node_map) -> LinkToggles:
+  """
+  resolves the node names of a replay plan schedule to (node_min_id, node_max_id)
+  """
+  link_toggles = []
+
+  for step, events in schedule:
+    step_toggles = []
+
+    for action, link_name, node1_name, node2_name in events:
+      node_min_id = min(node_map[node1_name], node_map[node2_name])
+      node_max_id = max(node_map[node1_name], node_map[node2_name])
+      step_toggles.append((action, link_name, node_min_id, node_max_id))
+
+    link_toggles.append((step, step_toggles))
+
+  return link_toggles
+
+
+def save_link_toggles(toggles_filepath, link_toggles: LinkToggles) -> None:
+  toggles_filepath = pathlib.Path(toggles_filepath)
+  temporary_toggles_filepath = toggles_filepath.with_name(f"{toggles_filepath.name}.{os.getpid()}.tmp")
+
+  with open(temporary_toggles_filepath, "wt", encoding="utf8") as f:
+    json.dump({"version": TOGGLES_VERSION, "steps": link_toggles}, f, separators=(",", ":"))
+
+  temporary_toggles_filepath.replace(toggles_filepath)  # atomic, see CoreScenario.write
+
+
+def load_link_toggles(toggles_filepath) -> LinkToggles:
+  with open(toggles_filepath, "rt", encoding="utf8") as f:
+    data = json.load(f)
+
+  if data.get("version") != TOGGLES_VERSION:
+    raise Exception(f"link toggle schedule {toggles_filepath} has version {data.get('version')}, expected {TOGGLES_VERSION}, recompile the scenario")
+
+  return [(step, [tuple(toggle) for toggle in toggles]) for step, toggles in data["steps"]]
@@ -0,0 +1,209 @@
+"""
+byte-offset step index for dgs files, stored as sidecar file next to the dgs file (<name>.dgs.index.json)
+
+the index maps every step (in file order, step 0 holds the 'an' instructions) to
+ - the step number
+ - the byte offset of its 'st' line
+ - the number of events in that step
+
+the index is built once and reused as long as the dgs file is unchanged:
+ - same size and modification time -> valid
+ - same size but different modification time -> the stored sha256 decides, a matching hash just refreshes the modification time
+ - otherwise the index is rebuilt
+
+with the index, a window of steps can be read straight from a memory map of the dgs file, without parsing anything before it
+
+usage:
+ dgs_index = DgsIndex.load_or_build(dgs_filepath)
+ node_names = dgs_index.read_nodes()
+ for step, events in dgs_index.steps(first=1, last=120):
+   ...
+"""
+import hashlib
+import json
+import mmap
+import os
+import pathlib
+from typing import Iterator, List, Optional, Tuple, Union
+
+from dgs_reader import AddEdge, DeleteEdge, collect_nodes, group_steps, parse_line, parse_lines
+
+
+INDEX_VERSION = 1
+
+
+def get_index_filepath(dgs_filepath) -> pathlib.Path:
+  dgs_filepath = pathlib.Path(dgs_filepath)
+  return dgs_filepath.with_name(dgs_filepath.name + ".index.json")
+
+
+def hash_file(filepath) -> str:
+  sha256 = hashlib.sha256()
+  with open(filepath, "rb") as f:
+    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+      sha256.update(chunk)
+  return sha256.hexdigest()
+
+
+class DgsIndex:
+
+  def __init__(self, dgs_filepath, size, mtime_ns, sha256, step_numbers, step_offsets, event_counts) -> None:
+    self.dgs_filepath = pathlib.Path(dgs_filepath)
+    self.size = size
+    self.mtime_ns = mtime_ns
+    self.sha256 = sha256
+    self.step_numbers: List[int] = step_numbers
+    self.step_offsets: List[int] = step_offsets
+    self.event_counts: List[int] = event_counts
+
+  def __len__(self) -> int:
+    return len(self.step_numbers)
+
+  @classmethod
+  def build(cls, dgs_filepath) -> "DgsIndex":
+    stat = os.stat(dgs_filepath)
+    sha256 = hashlib.sha256()
+    step_numbers, step_offsets, event_counts = [], [], []
+
+    with open(dgs_filepath, "rb") as f:
+      file_version = f.readline()
+      file_header = f.readline()
+      sha256.update(file_version)
+      sha256.update(file_header)
+
+      if file_version.rstrip(b"\r\n") != b"DGS004":
+        raise Exception(f"file version is '{file_version.decode('utf8').rstrip()}' but only 'DGS004' is supported")
+
+      offset = len(file_version) + len(file_header)
+
+      for line in f:
+        sha256.update(line)
+
+        if line.startswith(b"st "):
+          step_numbers.append(parse_line(line.decode("utf8").rstrip("\r\n")).number)
+          step_offsets.append(offset)
+          event_counts.append(0)
+        elif line.strip() != b"":
+          if not step_numbers:
+            raise Exception(f"unexpected line, expected 'st ..' got '{line.decode('utf8').rstrip()}'")
+          event_counts[-1] += 1
+
+        offset += len(line)
+
+    return cls(dgs_filepath, stat.st_size, stat.st_mtime_ns, sha256.hexdigest(), step_numbers, step_offsets, event_counts)
+
+  @classmethod
+  def load(cls, dgs_filepath) -> Optional["DgsIndex"]:
+    """
+    loads the sidecar index, returns None if there is none or it does not match the dgs file anymore
+    """
+    index_filepath = get_index_filepath(dgs_filepath)
+
+    if not index_filepath.exists():
+      return None
+
+    with open(index_filepath, "rt", encoding="utf8") as f:
+      data = json.load(f)
+
+    if data.get("version") != INDEX_VERSION:
+      return None
+
+    dgs_index = cls(dgs_filepath, data["size"], data["mtime_ns"], data["sha256"], data["step_numbers"], data["step_offsets"], data["event_counts"])
+    stat = os.stat(dgs_filepath)
+
+    if stat.st_size != dgs_index.size:
+      return None
+
+    if stat.st_mtime_ns != dgs_index.mtime_ns:
+      if hash_file(dgs_filepath) != dgs_index.sha256:
+        return None
+      dgs_index.mtime_ns = stat.st_mtime_ns
+      dgs_index.save()
+
+    return dgs_index
+
+  @classmethod
+  def load_or_build(cls, dgs_filepath) -> "DgsIndex":
+    dgs_index = cls.load(dgs_filepath)
+
+    if dgs_index is None:
+      print(f"building step index for {dgs_filepath}")
+      dgs_index = cls.build(dgs_filepath)
+      dgs_index.save()
+
+    return dgs_index
+
+  def save(self) -> None:
+    index_filepath = get_index_filepath(self.dgs_filepath)
+    temporary_index_filepath = index_filepath.with_name(f"{index_filepath.name}.{os.getpid()}.tmp")
+
+    with open(temporary_index_filepath, "wt", encoding="utf8") as f:
+      json.dump({
+        "version": INDEX_VERSION,
+        "size": self.size,
+        "mtime_ns": self.mtime_ns,
+        "sha256": self.sha256,
+        "step_numbers": self.step_numbers,
+        "step_offsets": self.step_offsets,
+        "event_counts": self.event_counts
+      }, f)
+
+    temporary_index_filepath.replace(index_filepath)  # atomic, runs started at the same time never read a half written index
+
+  def offset_of(self, step_index: int) -> int:
+    """
+    byte offset of the 'st' line of the step at the given position in the file, the file size for positions past the last step
+    """
+    if step_index >= len(self):
+      return self.size
+    return self.step_offsets[step_index]
+
+  def events_in(self, first: int = 0, last: Optional[int] = None) -> int:
+    """
+    number of events in the steps at positions first..last (inclusive)
+    """
+    return sum(self.event_counts[first:None if last is None else last+1])
+
+  def _read_window(self, mm: mmap.mmap, first: int, last: int) -> List[str]:
+    start = self.offset_of(first)
+    end = self.offset_of(last + 1)
+
+    if start >= end:
+      return []
+
+    return mm[start:end].decode("utf8").splitlines()
+
+  def _map(self) -> Tuple[object, mmap.mmap]:
+    f = open(self.dgs_filepath, "rb")
+    return f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+  def read_nodes(self) -> List[str]:
+    """
+    reads step 0, which must be the first step and only contain 'an' instructions
+    """
+    if len(self) == 0 or self.step_numbers[0] != 0:
+      raise Exception(f"'step 0' is missing, where each 'an ...' should be, aborting")
+
+    f, mm = self._map()
+    with f, mm:
+      records = parse_lines(self._read_window(mm, 0, 0))
+
+    next(records)  # 'st 0'
+    return collect_nodes(records)
+
+  def steps(self, first: int = 1, last: Optional[int] = None) -> Iterator[Tuple[int, List[Union[AddEdge, DeleteEdge]]]]:
+    """
+    yields (step-number, events) for the steps at positions first..last (inclusive, position 0 is the node step)
+
+    the window is parsed chunk-wise, so only a bounded part of the file is decoded at a time
+    """
+    if last is None:
+      last = len(self) - 1
+
+    chunk_size = 1024
+
+    f, mm = self._map()
+    with f, mm:
+      for chunk_first in range(first, last + 1, chunk_size):
+        chunk_last = min(chunk_first + chunk_size - 1, last)
+        yield from group_steps(parse_lines(self._read_window(mm, chunk_first, chunk_last)))
@@ -0,0 +1,153 @@
+"""
+single pass precomputation of everything "run-dgs.py" needs from the replayed step window of a dgs file
+
+a replay plan contains
+ - the participating nodes, e.g. all nodes of a link in the replayed steps (in step 0 order),
+   a contact that is added and removed within one step creates no link and does not make its nodes participate
+ - the unique undirected links between them (in order of their first activation)
+ - the activation schedule: per replayed step, the links whose state actually flips, with both node names resolved
+
+the schedule is a per-step link-state diff, a link is active while at least one edge between its nodes exists:
+ - an 'ae' and 'de' of the same link within one step cancel out
+ - an 'ae' of a link that is already active under another edge name is dropped, as is a 'de' while another edge remains
+each remaining entry is named after the last edge that touched the link in that step
+
+plans are cached as json files in a "cache" directory next to the dgs file, keyed by the dgs sha256 and the replayed step window,
+so repeated experiments on the same trace skip the precomputation
+
+usage:
+ replay_plan = ReplayPlan.load_or_compute(dgs_index, first_step=1, num_steps=120)
+"""
+import json
+import os
+import pathlib
+from typing import List, Optional, Tuple
+
+from dgs_index import DgsIndex
+from dgs_reader import AddEdge
+
+
+PLAN_VERSION = 3
+
+
+def get_plan_filepath(dgs_index: DgsIndex, first_step: int, num_steps: int) -> pathlib.Path:
+  return dgs_index.dgs_filepath.parent / "cache" / f"{dgs_index.sha256}-{first_step}-{num_steps}.plan.json"
+
+
+class ReplayPlan:
+
+  def __init__(self, first_step, num_steps, node_names, links, schedule, skipped_delete_edges=0, num_trace_events=0) -> None:
+    self.first_step: int = first_step
+    self.num_steps: int = num_steps
+    self.node_names: List[str] = node_names
+    self.links: List[Tuple[str, str]] = links
+    self.schedule: List[Tuple[int, List[Tuple[str, str, str, str]]]] = schedule  # (step-number, [(action, link-name, node1-name, node2-name)])
+    self.skipped_delete_edges: int = skipped_delete_edges  # 'de' of links added before the replayed steps
+    self.num_trace_events: int = num_trace_events  # 'ae'/'de' instructions in the replayed steps, without the skipped ones
+
+  @property
+  def num_link_edits(self) -> int:
+    return sum(len(events) for _, events in self.schedule)
+
+  @classmethod
+  def compute(cls, dgs_index: DgsIndex, first_step: int, num_steps: int) -> "ReplayPlan":
+    participating_nodes = set()
+    links = {}  # (node1-name, node2-name) -> None, used as insertion ordered set
+    link_names = {}  # link-name -> (node1-name, node2-name)
+    active_edges = {}  # (node1-name, node2-name) -> names of the edges currently active between them
+    schedule = []
+    skipped_delete_edges = 0
+    num_trace_events = 0
+
+    for step, events in dgs_index.steps(first_step, first_step + num_steps - 1):
+      was_active = {}  # (node1-name, node2-name) -> active before this step, for every link touched in this step
+      last_link_names = {}  # (node1-name, node2-name) -> last edge name of this step
+
+      for event in events:
+        if isinstance(event, AddEdge):
+          node_pair = tuple(sorted((event.node1_name, event.node2_name)))
+
+          link_names[event.edge_name] = node_pair
+          was_active.setdefault(node_pair, node_pair in active_edges)
+          active_edges.setdefault(node_pair, set()).add(event.edge_name)
+        elif event.edge_name in link_names:
+          node_pair = link_names.pop(event.edge_name)
+
+          was_active.setdefault(node_pair, node_pair in active_edges)
+          active_edges[node_pair].discard(event.edge_name)
+          if not active_edges[node_pair]:
+            del active_edges[node_pair]
+        else:
+          skipped_delete_edges += 1
+          continue
+
+        num_trace_events += 1
+        last_link_names[node_pair] = event.edge_name
+
+      step_events = []
+
+      for node_pair, active_before in was_active.items():
+        if (node_pair in active_edges) != active_before:
+          step_events.append(("de" if active_before else "ae", last_link_names[node_pair], *node_pair))
+          if node_pair not in links:
+            links[node_pair] = None
+            participating_nodes.update(node_pair)
+
+      schedule.append((step, step_events))
+
+    node_names = [node_name for node_name in dgs_index.read_nodes() if node_name in participating_nodes]
+
+    return cls(first_step, num_steps, node_names, list(links), schedule, skipped_delete_edges, num_trace_events)
+
+  @classmethod
+  def load(cls, plan_filepath) -> Optional["ReplayPlan"]:
+    if not plan_filepath.exists():
+      return None
+
+    with open(plan_filepath, "rt", encoding="utf8") as f:
+      data = json.load(f)
+
+    if data.get("version") != PLAN_VERSION:
+      return None
+
+    return cls(
+      data["first_step"],
+      data["num_steps"],
+      data["node_names"],
+      [tuple(link) for link in data["links"]],
+      [(step, [tuple(event) for event in events]) for step, events in data["schedule"]],
+      data["skipped_delete_edges"],
+      data["num_trace_events"]
+    )
+
+  @classmethod
+  def load_or_compute(cls, dgs_index: DgsIndex, first_step: int, num_steps: int) -> "ReplayPlan":
+    plan_filepath = get_plan_filepath(dgs_index, first_step, num_steps)
+    replay_plan = cls.load(plan_filepath)
+
+    if replay_plan is None:
+      print(f"precomputing replay plan for steps {first_step} to {first_step + num_steps - 1}")
+      replay_plan = cls.compute(dgs_index, first_step, num_steps)
+      replay_plan.save(plan_filepath)
+    else:
+      print(f"loaded cached replay plan {plan_filepath.name}")
+
+    return replay_plan
+
+  def save(self, plan_filepath) -> None:
+    plan_filepath.parent.mkdir(parents=True, exist_ok=True)
+    temporary_plan_filepath = plan_filepath.with_name(f"{plan_filepath.name}.{os.getpid()}.tmp")
+
+    with open(temporary_plan_filepath, "wt", encoding="utf8") as f:
+      json.dump({
+        "version": PLAN_VERSION,
+        "first_step": self.first_step,
+        "num_steps": self.num_steps,
+        "node_names": self.node_names,
+        "links": self.links,
+        "schedule": self.schedule,
+        "skipped_delete_edges": self.skipped_delete_edges,
+        "num_trace_events": self.num_trace_events
+      }, f)
+
+    temporary_plan_filepath.replace(plan_filepath)  # atomic, runs started at the same time never read a half written plan
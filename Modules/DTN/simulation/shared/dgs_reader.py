@@ -0,0 +1,120 @@
+"""
+parser for the rudimentary dgs files written by "contacts-to-dgs.py"
+(info taken from https://graphstream-project.org/doc/Advanced-Concepts/The-DGS-File-Format/)
+
+supported operations:
+ st <number>
+ an <node-id>
+ ae <edge-id> <node-id1> <node-id2>
+ de <edge-id>
+
+lines are parsed one at a time, so parsing is linear in the input and only the current step is held in memory
+the file itself (version header, step offsets, windows of steps) is read by "dgs_index.py"
+
+usage:
+ records = parse_lines(lines)               # lines after the header, as Step, AddNode, AddEdge and DeleteEdge records
+ node_names = collect_nodes(records)        # the records of step 0, only 'an' instructions
+ for step, events in group_steps(records):  # records of the following steps, grouped into their 'ae' and 'de' instructions
+   ...
+"""
+from typing import Iterable, Iterator, List, NamedTuple, Tuple, Union
+
+
+class Step(NamedTuple):
+  number: int
+
+  def __str__(self) -> str:
+    return f"st {self.number}"
+
+
+class AddNode(NamedTuple):
+  node_name: str
+
+  def __str__(self) -> str:
+    return f"an {self.node_name}"
+
+
+class AddEdge(NamedTuple):
+  edge_name: str
+  node1_name: str
+  node2_name: str
+
+  def __str__(self) -> str:
+    return f"ae {self.edge_name} {self.node1_name} {self.node2_name}"
+
+
+class DeleteEdge(NamedTuple):
+  edge_name: str
+
+  def __str__(self) -> str:
+    return f"de {self.edge_name}"
+
+
+Event = Union[AddNode, AddEdge, DeleteEdge]
+Record = Union[Step, Event]
+
+
+def parse_line(line: str) -> Record:
+  action, *others = line.split(" ")
+
+  try:
+    if action == "st":
+      return Step(int(others[0]))
+    if action == "an":
+      return AddNode(others[0])
+    if action == "ae" and len(others) == 3:
+      return AddEdge(*others)
+    if action == "de":
+      return DeleteEdge(others[0])
+  except (IndexError, ValueError):
+    pass
+
+  raise Exception(f"unknown action '{line}'")
+
+
+def parse_lines(lines: Iterable[str]) -> Iterator[Record]:
+  for line in lines:
+    line = line.rstrip("\r\n")
+    if line == "":
+      continue
+    yield parse_line(line)
+
+
+def collect_nodes(records: Iterable[Record]) -> List[str]:
+  """
+  collects the node names of the records following 'st 0', which must all be 'an' instructions
+  """
+  node_names = []
+
+  for record in records:
+    if not isinstance(record, AddNode):
+      raise Exception(f"unexpected line in setup step 0, expected 'an ..' got '{record}'")
+
+    node_names.append(record.node_name)
+
+  return node_names
+
+
+def group_steps(records: Iterable[Record]) -> Iterator[Tuple[int, List[Union[AddEdge, DeleteEdge]]]]:
+  """
+  groups records into (step-number, events), a step only contains 'ae' and 'de' instructions
+  """
+  step = None
+  events = []
+
+  for record in records:
+    if isinstance(record, Step):
+      if step is not None:
+        yield step, events
+      step = record.number
+      events = []
+    elif step is None:
+      raise Exception(f"unexpected line, expected 'st ..' got '{record}'")
+    elif isinstance(record, AddNode):
+      raise Exception(f"unknown action '{record}'")
+    else:
+      events.append(record)
+
+  if step is not None:
+    yield step, events
+
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import pathlib
+import random
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter
+from concurrent import futures
+
+import grpc
+from google.protobuf import json_format, message_factory
+from core.api.grpc import core_pb2
+
+
+this_filepath = pathlib.Path(__file__).parent.resolve()
+
+address = "localhost:50051"  # run-dgs.py connects to its core_address setting
+latency_milliseconds = 0.0  # injected into every call
+jitter_milliseconds = 0.0  # uniformly random extra latency on top
+method_latency_milliseconds = {}  # per grpc method, e.g. {"EditLink": 5.0}, replaces latency_milliseconds
+max_workers = 32  # concurrently handled calls
+
+
+# stand-in for core-daemon, to benchmark and regression-test "run-dgs.py" without CORE, root or network namespaces
+#
+# usage: fake-core-server.py [--address localhost:50051] [--latency-ms 2] [--jitter-ms 1] [--method-latency-ms EditLink=5] [--record calls.jsonl]
+#  then run "run-dgs.py" with core_address set to the same address
+#
+# every unary call of the CoreApi service is answered, the service is read from the core_pb2 descriptor,
+# so no generated servicer is needed and the stand-in follows the installed core version
+# calls are answered with an empty response, in which the usual fields are filled in:
+#  session_id   a new session for CreateSession and OpenXml (with the nodes, links, options and metadata of the xml), otherwise the requested one
+#  node_id      the requested node id (or a new one)
+#  result       true
+#  data         the generated dtnd.toml for GetNodeServiceFile (from "core_services/dtnd.py"), empty for other files
+# sessions keep their state, options, metadata, nodes and links (with their loss), so GetSession and GetSessions reflect what the driver did
+#
+# every call is recorded with its method, the injected latency and its request (with --record, as json lines)
+# a per method call count is printed on exit (ctrl-c)
+
+
+# protobuf 4 replaced MessageFactory.GetPrototype with GetMessageClass
+def get_message_class(descriptor):
+  if hasattr(message_factory, "GetMessageClass"):
+    return message_factory.GetMessageClass(descriptor)
+  return message_factory.MessageFactory().GetPrototype(descriptor)
+
+
+class FakeSession:
+
+  def __init__(self, session_id) -> None:
+    self.id = session_id
+    self.state = core_pb2.SessionState.DEFINITION
+    self.options = {}
+    self.metadata = {}
+    self.node_names = {}  # node id -> node name
+    self.links = {}  # (node1_id, node2_id) -> (iface1_id, iface2_id, loss)
+
+  def load_xml(self, xml_data) -> None:
+    """
+    takes the nodes, links, options and metadata of a CORE xml scenario, e.g. one compiled by "core_scenario.py"
+    """
+    scenario = ET.fromstring(xml_data)
+
+    for node in (*scenario.iterfind("./networks/network"), *scenario.iterfind("./devices/device")):
+      self.node_names[int(node.get("id"))] = node.get("name")
+
+    for link in scenario.iterfind("./links/link"):
+      node1_id, node2_id = int(link.get("node1")), int(link.get("node2"))
+      iface1_id, iface2_id = (int(link.find(tag).get("id")) if link.find(tag) is not None else 0 for tag in ("iface1", "iface2"))
+      loss = float(link.find("options").get("loss", 0)) if link.find("options") is not None else 0.0
+      self.links[(min(node1_id, node2_id), max(node1_id, node2_id))] = (iface1_id, iface2_id, loss)
+
+    self.options.update((option.get("name"), option.get("value")) for option in scenario.iterfind("./session_options/configuration"))
+    self.metadata.update((entry.get("name"), entry.get("value")) for entry in scenario.iterfind("./session_metadata/configuration"))
+
+
+class FakeNode:
+  """
+  the parts of a core node the dtnd service uses to generate its configuration
+  """
+
+  def __init__(self, session, name) -> None:
+    self.session = session
+    self.name = name
+
+
+class FakeCoreApi:
+
+  def __init__(self, record_filepath=None) -> None:
+    self.lock = threading.Lock()
+    self.sessions = {}
+    self.next_session_id = 1
+    self.call_counts = Counter()
+    self.record_file = open(record_filepath, "wt", encoding="utf8") if record_filepath is not None else None
+    self.dtnd_service = self._load_dtnd_service()
+
+  def _load_dtnd_service(self):
+    sys.path.append(str(this_filepath.parent / "core_services"))
+    from dtnd import DtndService
+    return DtndService
+
+  def _new_session(self) -> FakeSession:
+    session = FakeSession(self.next_session_id)
+    self.sessions[session.id] = session
+    self.next_session_id += 1
+    return session
+
+  def _latency(self, method_name) -> float:
+    latency = method_latency_milliseconds.get(method_name, latency_milliseconds)
+    return (latency + random.uniform(0, jitter_milliseconds)) / 1000
+
+  def _record(self, method_name, request, latency) -> None:
+    with self.lock:
+      self.call_counts[method_name] += 1
+
+      if self.record_file is not None:
+        self.record_file.write(json.dumps({
+          "time": time.time(),
+          "method": method_name,
+          "latency_ms": round(latency * 1000, 3),
+          "request": json_format.MessageToDict(request)
+        }) + "\n")
+        self.record_file.flush()
+
+  def _link_key(self, request):
+    link = request.link if request.DESCRIPTOR.fields_by_name.get("link") is not None else request
+    return min(link.node1_id, link.node2_id), max(link.node1_id, link.node2_id)
+
+  def _update_state(self, method_name, request, response) -> None:
+    session = self.sessions.get(getattr(request, "session_id", None))
+
+    if method_name == "GetSessions":
+      for session in self.sessions.values():
+        response.sessions.add(id=session.id, state=session.state, nodes=len(session.node_names), dir=f"/tmp/pycore.{session.id}")
+      return
+
+    if method_name in ("CreateSession", "OpenXml"):
+      session = self._new_session()
+      session.state = core_pb2.SessionState.CONFIGURATION
+      response.session_id = session.id
+      if method_name == "OpenXml":
+        session.load_xml(request.data)
+    elif session is None:
+      return
+    elif method_name == "DeleteSession":
+      del self.sessions[session.id]
+    elif method_name == "SetSessionState":
+      session.state = request.state
+    elif method_name == "SetSessionOptions":
+      session.options.update(request.config)
+    elif method_name == "SetSessionMetadata":
+      session.metadata.update(request.config)
+    elif method_name == "AddNode":
+      node_id = request.node.id or max(session.node_names, default=0) + 1
+      session.node_names[node_id] = request.node.name
+      response.node_id = node_id
+    elif method_name == "GetNodeServiceFile":
+      if request.service == self.dtnd_service.name and request.file in self.dtnd_service.configs:
+        node = FakeNode(session, session.node_names.get(request.node_id, f"n{request.node_id}"))
+        response.data = self.dtnd_service.generate_config(node, request.file)
+    elif method_name == "AddLink":
+      session.links[self._link_key(request)] = (request.link.iface1.id, request.link.iface2.id, request.link.options.loss)
+    elif method_name == "EditLink":
+      iface1_id, iface2_id, _ = session.links[self._link_key(request)]
+      session.links[self._link_key(request)] = (iface1_id, iface2_id, request.options.loss)
+    elif method_name == "DeleteLink":
+      session.links.pop(self._link_key(request), None)
+    elif method_name == "GetSession":
+      response.session.id = session.id
+      response.session.state = session.state
+      response.session.dir = f"/tmp/pycore.{session.id}"
+      for node_id, node_name in session.node_names.items():
+        response.session.nodes.add(id=node_id, name=node_name)
+      for (node1_id, node2_id), (iface1_id, iface2_id, loss) in session.links.items():
+        link = response.session.links.add(node1_id=node1_id, node2_id=node2_id)
+        link.iface1.id, link.iface2.id, link.options.loss = iface1_id, iface2_id, loss
+
+  def handler(self, method_name, response_class):
+    def handle(request, context):
+      latency = self._latency(method_name)
+      if latency > 0:
+        time.sleep(latency)
+
+      response = response_class()
+
+      with self.lock:
+        self._update_state(method_name, request, response)
+
+      if "result" in response.DESCRIPTOR.fields_by_name:
+        response.result = True
+
+      self._record(method_name, request, latency)
+      return response
+
+    return handle
+
+  def generic_handler(self) -> grpc.GenericRpcHandler:
+    service = core_pb2.DESCRIPTOR.services_by_name["CoreApi"]
+    method_handlers = {}
+
+    for method in service.methods:
+      if method.client_streaming or method.server_streaming:
+        continue
+
+      request_class = get_message_class(method.input_type)
+      response_class = get_message_class(method.output_type)
+
+      method_handlers[method.name] = grpc.unary_unary_rpc_method_handler(
+        self.handler(method.name, response_class),
+        request_deserializer=request_class.FromString,
+        response_serializer=response_class.SerializeToString
+      )
+
+    return grpc.method_handlers_generic_handler(service.full_name, method_handlers)
+
+
+argument_parser = argparse.ArgumentParser(description="stand-in core-daemon that answers and records grpc calls with injected latency")
+argument_parser.add_argument("--address", default=address)
+argument_parser.add_argument("--latency-ms", type=float, default=latency_milliseconds)
+argument_parser.add_argument("--jitter-ms", type=float, default=jitter_milliseconds)
+argument_parser.add_argument("--method-latency-ms", action="append", default=[], metavar="METHOD=MS", help="e.g. EditLink=5, can be repeated")
+argument_parser.add_argument("--record", type=pathlib.Path, help="json lines file every call is written to")
+arguments = argument_parser.parse_args()
+
+latency_milliseconds = arguments.latency_ms
+jitter_milliseconds = arguments.jitter_ms
+for method_latency in arguments.method_latency_ms:
+  method_name, milliseconds = method_latency.split("=")
+  method_latency_milliseconds[method_name] = float(milliseconds)
+
+fake_core_api = FakeCoreApi(arguments.record)
+
+server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers))
+server.add_generic_rpc_handlers((fake_core_api.generic_handler(),))
+server.add_insecure_port(arguments.address)
+server.start()
+print(f"fake core-daemon listening on {arguments.address}, latency {latency_milliseconds}ms (+ up to {jitter_milliseconds}ms), per method {method_latency_milliseconds}")
+
+try:
+  server.wait_for_termination()
+except KeyboardInterrupt:
+  server.stop(0)
+finally:
+  print(f"calls: {dict(fake_core_api.call_counts)}")
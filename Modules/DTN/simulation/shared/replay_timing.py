@@ -0,0 +1,94 @@
+"""
+json-lines timing stream of a replay, one line per replayed step and a summary line at the end
+
+a step line holds the scheduled and actual start, the end, the lateness and every rpc the step sent with its latency
+timestamps use the format of the monitoring data (e.g. "2024-08-12T16:41:44.797120Z[UTC]"), so both can be plotted on one time axis
+
+example step line:
+ {"type": "step", "step": 13, "scheduled": "...Z[UTC]", "started": "...Z[UTC]", "ended": "...Z[UTC]", "lateness_ms": 0.4, "duration_ms": 3.1,
+  "rpcs": [{"rpc": "edit_link", "link": [6, 28], "loss": 100, "latency_ms": 1.5}, ...]}
+
+usage:
+ timing_log = ReplayTimingLog(filepath)  # append=True continues the stream of a resumed replay
+ timing_log.write_step(step, scheduled, started, ended, rpcs)  # monotonic clock times, rpcs as (rpc, node_min_id, node_max_id, loss, latency-seconds)
+ summary = timing_log.close()
+"""
+import json
+import math
+import pathlib
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+
+RpcTiming = Tuple[str, int, int, int, float]  # (rpc, node_min_id, node_max_id, loss, latency in seconds)
+
+
+def utc_timestamp(unix_time: float) -> str:
+  return datetime.fromtimestamp(unix_time, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ[UTC]')
+
+
+def percentile(values: List[float], p: float) -> float:
+  """
+  nearest-rank percentile, 0 for no values
+  """
+  if not values:
+    return 0.0
+
+  values = sorted(values)
+  return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+class ReplayTimingLog:
+
+  def __init__(self, filepath, clock=time.monotonic, append=False) -> None:
+    self.filepath = pathlib.Path(filepath)
+    self.filepath.parent.mkdir(parents=True, exist_ok=True)
+    self.file = open(self.filepath, "at" if append else "wt", encoding="utf8")
+
+    self.wall_clock_offset = time.time() - clock()  # converts monotonic clock times to unix times
+    self.rpc_latencies: List[float] = []
+    self.lateness: List[float] = []
+
+  def _timestamp(self, monotonic_time: float) -> str:
+    return utc_timestamp(monotonic_time + self.wall_clock_offset)
+
+  def write_step(self, step: int, scheduled: float, started: float, ended: float, rpcs: List[RpcTiming]) -> None:
+    lateness = max(0.0, started - scheduled)
+
+    self.lateness.append(lateness)
+    self.rpc_latencies.extend(latency for *_, latency in rpcs)
+
+    self.file.write(json.dumps({
+      "type": "step",
+      "step": step,
+      "scheduled": self._timestamp(scheduled),
+      "started": self._timestamp(started),
+      "ended": self._timestamp(ended),
+      "lateness_ms": round(lateness * 1000, 3),
+      "duration_ms": round((ended - started) * 1000, 3),
+      "rpcs": [{"rpc": rpc, "link": [node_min_id, node_max_id], "loss": loss, "latency_ms": round(latency * 1000, 3)} for rpc, node_min_id, node_max_id, loss, latency in rpcs]
+    }) + "\n")
+    self.file.flush()
+
+  def summary(self) -> Dict[str, float]:
+    return {
+      "steps": len(self.lateness),
+      "rpcs": len(self.rpc_latencies),
+      "rpc_latency_p50_ms": round(percentile(self.rpc_latencies, 50) * 1000, 3),
+      "rpc_latency_p99_ms": round(percentile(self.rpc_latencies, 99) * 1000, 3),
+      "max_drift_ms": round(max(self.lateness, default=0.0) * 1000, 3)
+    }
+
+  def close(self) -> Dict[str, float]:
+    """
+    writes the summary line and closes the stream
+
+    :return: the summary
+    """
+    summary = self.summary()
+
+    self.file.write(json.dumps({"type": "summary", **summary}) + "\n")
+    self.file.close()
+
+    return summary
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import pathlib
+import signal
+import time
+
+from replay_timing import utc_timestamp
+
+
+interval_seconds = 1.0  # time between two samples
+process_names = ("dtnd", "rdt_tool")  # executables that are sampled
+
+
+# samples the resource usage of every dtnd and rdt_tool process of a CORE session into a json-lines time series
+#
+# usage: resource-sampler.py <output-file> [--session-dir /tmp/pycore.1] [--interval 1.0] [--append] [--parent-pid 1234]
+#  "run-dgs.py" starts it for the replay, writing resources.data into the monitoring dir, it stops on SIGTERM or ctrl-c
+#  and when its parent (or --parent-pid) exits, also when "run-dgs.py" is killed, e.g. after a timeout of "run-sweep.py"
+#
+# the nodes of a CORE session only have their own network namespace, their processes are visible in /proc
+# a process belongs to the node whose directory (<session-dir>/<node-name>.conf) is its working directory
+#
+# output:
+#  {"type": "fields", "fields": ["cpu_seconds", "rss_kb", "sockets"]}
+#  {"type": "sample", "time": "2024-08-12T16:41:44.797120Z[UTC]", "processes": {"n1/dtnd": [0.52, 10240, 7], "n1/rdt_tool:routing": [3.1, 81234, 4], ...}}
+#  ...
+# cpu_seconds is the user and system time used so far (the cpu usage of an interval is the difference between two samples)
+# rss_kb is the resident memory, sockets the number of open socket file descriptors
+# rdt_tool processes are named after their mode (-m), e.g. rdt_tool:routing, rdt_tool:client, rdt_tool:monitoring
+
+
+clock_ticks_per_second = os.sysconf("SC_CLK_TCK")
+
+
+def get_process_name(pid):
+  with open(f"/proc/{pid}/cmdline", "rb") as f:
+    args = [arg.decode("utf8", errors="replace") for arg in f.read().split(b"\0")]
+
+  executable = os.path.basename(args[0])
+  if executable not in process_names:
+    return None
+
+  if "-m" in args[:-1]:
+    return f"{executable}:{args[args.index('-m') + 1]}"
+  return executable
+
+
+def get_node_name(pid, session_dirpath):
+  node_dirpath = pathlib.Path(os.readlink(f"/proc/{pid}/cwd"))
+
+  if node_dirpath.suffix != ".conf" or (session_dirpath is not None and node_dirpath.parent != session_dirpath):
+    return None
+  return node_dirpath.stem
+
+
+def sample_process(pid):
+  with open(f"/proc/{pid}/stat", "rt", encoding="utf8") as f:
+    stat_fields = f.read().rsplit(")", 1)[1].split()  # the fields after the (possibly space containing) command name, starting with the state
+  cpu_seconds = (int(stat_fields[11]) + int(stat_fields[12])) / clock_ticks_per_second  # utime and stime
+
+  with open(f"/proc/{pid}/status", "rt", encoding="utf8") as f:
+    rss_kb = next((int(line.split()[1]) for line in f if line.startswith("VmRSS:")), 0)
+
+  sockets = 0
+  for fd in os.listdir(f"/proc/{pid}/fd"):
+    try:
+      sockets += os.readlink(f"/proc/{pid}/fd/{fd}").startswith("socket:")
+    except FileNotFoundError:
+      pass  # closed in the meantime
+
+  return [round(cpu_seconds, 2), rss_kb, sockets]
+
+
+def sample(session_dirpath):
+  processes = {}
+
+  for pid in (entry for entry in os.listdir("/proc") if entry.isdigit()):
+    try:
+      process_name = get_process_name(pid)
+      if process_name is None:
+        continue
+
+      node_name = get_node_name(pid, session_dirpath)
+      if node_name is None:
+        continue
+
+      processes[f"{node_name}/{process_name}"] = sample_process(pid)
+    except (FileNotFoundError, ProcessLookupError):
+      pass  # the process exited while it was read
+
+  return processes
+
+
+argument_parser = argparse.ArgumentParser(description="samples cpu time, memory and sockets of the dtnd and rdt_tool processes of a CORE session")
+argument_parser.add_argument("output_file", type=pathlib.Path)
+argument_parser.add_argument("--session-dir", type=pathlib.Path, help="only sample the nodes of this session, e.g. /tmp/pycore.1")
+argument_parser.add_argument("--interval", type=float, default=interval_seconds, help="seconds between two samples")
+argument_parser.add_argument("--append", action="store_true", help="continue an existing time series, e.g. of a resumed replay")
+argument_parser.add_argument("--parent-pid", type=int, default=os.getppid(), help="stop once this process is no longer the parent, default: the parent at start")
+arguments = argument_parser.parse_args()
+
+running = True
+
+def stop(signal_number, frame):
+  global running
+  running = False
+
+signal.signal(signal.SIGTERM, stop)
+signal.signal(signal.SIGINT, stop)
+
+arguments.output_file.parent.mkdir(parents=True, exist_ok=True)
+
+with open(arguments.output_file, "at" if arguments.append else "wt", encoding="utf8") as output_file:
+  if not arguments.append:
+    output_file.write(json.dumps({"type": "fields", "fields": ["cpu_seconds", "rss_kb", "sockets"]}) + "\n")
+
+  next_sample_time = time.monotonic()
+
+  # a process whose parent exits is handed to another one
+  while running and os.getppid() == arguments.parent_pid:
+    output_file.write(json.dumps({"type": "sample", "time": utc_timestamp(time.time()), "processes": sample(arguments.session_dir)}, separators=(",", ":")) + "\n")
+    output_file.flush()
+
+    # samples stay on a fixed grid, the time a sample takes is not added to the interval
+    next_sample_time += arguments.interval
+    time.sleep(max(0.0, next_sample_time - time.monotonic()))
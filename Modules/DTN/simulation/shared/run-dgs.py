@@ -1,21 +1,74 @@
 #!/usr/bin/env python3
+import argparse
+import atexit
+import hashlib
+import ipaddress
+import json
+import math
+import os
 import pathlib
-import re
+import subprocess
+import sys
 import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 
+import grpc
 from core.api.grpc import client
 from core.api.grpc.core_pb2 import Node, NodeType, Position, SessionState, Interface, LinkOptions
+from core.api.grpc.services_pb2 import ServiceAction
 from core.utils import random_mac
 
+from core_scenario import CoreScenario, compile_link_toggles, load_link_toggles, save_link_toggles
+from dgs_index import DgsIndex
+from dgs_precompute import PLAN_VERSION, ReplayPlan
+from replay_timing import ReplayTimingLog
+from step_scheduler import StepScheduler
+
 
 this_filepath = pathlib.Path(__file__).parent.resolve()
 
+# the rdt_tool command of the core services, they are next to this directory in the repo and in /root/.core/myservices in the showroom image
+for core_services_dirpath in (this_filepath.parent / "core_services", pathlib.Path("/root/.core/myservices")):
+  if (core_services_dirpath / "node_limits.py").exists():
+    sys.path.append(str(core_services_dirpath))
+    break
+from node_limits import get_limited_rdt_tool
+rdt_tool_default_monitoring_dir = "/shared/monitoring"  # where "rdt_tool -m monitoring" writes without -md (the shared dir mounted into the container)
+
 dgs_filepath = this_filepath / "data" / "dgs" / "exp1.dgs"
 
+first_replayed_step = 1  # position of the first replayed step in the dgs file (step 0 holds the nodes)
 cutoff_after_x_steps = 120
 wait_time_per_step_seconds = 5.0
+step_timing = "fixed"  # options: "fixed" (every step takes wait_time_per_step_seconds), "trace" (steps keep the real gaps between their step numbers)
+replay_speedup_factor = 1.0  # >1 compresses the replay, e.g. 10.0 replays ten times faster than the chosen step timing
+setup_mode = "rpc"  # options: "rpc" (one grpc call per node, link and service file), "scenario" (compile a CORE xml scenario once, load it with a single call)
+parallel_setup = False  # add nodes, links and dtnd configs over a worker pool instead of one call after another
+max_parallel_setup_calls = 16  # upper bound of in-flight setup calls when parallel_setup is enabled
+concurrent_link_edits = False  # send all link edits of a step concurrently instead of one after another
+max_concurrent_link_edits = 16  # upper bound of in-flight edit_link calls when concurrent_link_edits is enabled
+lazy_link_creation = False  # add a link when its first 'ae' fires instead of adding every link (deactivated) during setup
+lazy_link_idle_teardown_seconds = None  # with lazy_link_creation: delete links that stayed deactivated this long, None keeps them
+link_address_pool = "10.0.0.0/8"  # each link gets its own point-to-point subnet from this pool
+link_prefix_length = 30  # options: 30, 31 (two usable addresses per link either way)
 janitor_interval_milliseconds = 2500
 discovery_interval_milliseconds = 500
+control_network = "172.16.0.0/24"  # sessions running at the same time need distinct control networks (see "run-sweep.py")
+monitoring_dir = None  # directory the monitoring node writes to, None keeps the rdt_tool default (rdt_tool_default_monitoring_dir)
+interactive = True  # wait for enter before starting the replay
+delete_session_at_end = False  # delete the session after shutting it down, e.g. for back to back runs (see "run-sweep.py")
+warm_session = False  # keep the session running at the end and reuse it in the next run with the same trace and topology
+replay_timing_log = True  # write a json-lines timing record per step to replay.data next to the monitoring output
+fast_forward_idle = False  # compress quiet stretches of the replay, see "special case: fast-forward"
+fast_forward_lookahead_steps = 30  # a stretch is quiet when no link changes for this much step time (seconds with step_timing "trace", steps with "fixed")
+fast_forward_max_skip_seconds = 60.0  # at most this much wall-clock time is cut from one quiet stretch, over all of its steps
+checkpoint_replay = True  # record the progress after every step, so a crashed replay can be continued with --resume
+resource_sampling = False  # record cpu time, memory and sockets of every dtnd and rdt_tool process to resources.data next to the monitoring output
+resource_sampling_interval_seconds = 1.0
+dtnd_stats = False  # record bundle store size, peers and bundle counters of every dtnd to dtnd.data next to the monitoring output ("dtn7-stats" from scripts/ has to be on the PATH)
+dtnd_stats_interval_seconds = 1.0
+core_address = "localhost:50051"  # core-daemon grpc address, point it at "fake-core-server.py" to benchmark the driver without CORE
 
 rdt_variant = "addwins"  # options: "addwins", "observeremove", "lastwriterwins"
 clients = {
@@ -43,6 +96,11 @@ router_variant = "rdt"  # options: "flooding", "epidemic", "spray", "rdt", "rdt2
 rdt_client_operation_mode = "pushall"  # options: "pushall", "requestlater"
 
 dtnd_cla = "udp"
+dtnd_cla_port = 16163  # cla.0.port in dtnd.toml
+node_cpu_weight = None  # cgroup v2 cpu.weight of every node (1 to 10000, default 100), None: no cgroup limits
+node_memory_max = None  # cgroup v2 memory.max of every node, e.g. "512M", shared by dtnd and all rdt_tool processes of the node, None: no cap
+rdt_tool_max_heap = None  # heap cap of each rdt_tool process, e.g. "256m" (-Xmx256m), None: rdt_tool default
+peer_discovery = "beacons"  # options: "beacons" (dtnd beacons at every potential neighbour), "injected" (run-dgs.py adds and removes the peers at each 'ae'/'de')
 
 # special configs
 addwins_rdt_number_of_additions = 2000
@@ -51,6 +109,46 @@ addwins_rdt_sleep_time_milliseconds = int((500 * 1000) / addwins_rdt_number_of_a
 router_rdt_n_total_nodes = 10
 router_rdt_top_n_neighbours = 5
 
+# command line: every setting above can be overridden by a json file, e.g. --config sweep-point.json containing {"rdt_variant": "observeremove"}
+overridable_settings = (
+  "dgs_filepath", "first_replayed_step", "cutoff_after_x_steps", "wait_time_per_step_seconds", "step_timing", "replay_speedup_factor",
+  "setup_mode", "parallel_setup", "max_parallel_setup_calls", "concurrent_link_edits", "max_concurrent_link_edits",
+  "lazy_link_creation", "lazy_link_idle_teardown_seconds", "link_address_pool", "link_prefix_length",
+  "janitor_interval_milliseconds", "discovery_interval_milliseconds", "control_network", "monitoring_dir", "interactive", "delete_session_at_end", "warm_session", "replay_timing_log",
+  "resource_sampling", "resource_sampling_interval_seconds", "dtnd_stats", "dtnd_stats_interval_seconds",
+  "fast_forward_idle", "fast_forward_lookahead_steps", "fast_forward_max_skip_seconds", "checkpoint_replay", "core_address",
+  "rdt_variant", "clients", "router_variant", "rdt_client_operation_mode", "dtnd_cla", "dtnd_cla_port",
+  "node_cpu_weight", "node_memory_max", "rdt_tool_max_heap", "peer_discovery",
+  "addwins_rdt_number_of_additions", "addwins_rdt_sleep_time_milliseconds", "router_rdt_n_total_nodes", "router_rdt_top_n_neighbours"
+)
+
+argument_parser = argparse.ArgumentParser(description="replays a dgs file in a CORE session")
+argument_parser.add_argument("--config", type=pathlib.Path, help="json file with settings that override the ones at the top of this script")
+argument_parser.add_argument("--non-interactive", action="store_true", help="start the replay without waiting for enter")
+argument_parser.add_argument("--resume", action="store_true", help="continue the replay of a crashed run from its checkpoint, with the same settings")
+arguments = argument_parser.parse_args()
+
+if arguments.config is not None:
+  with open(arguments.config, "rt", encoding="utf8") as f:
+    config_overrides = json.load(f)
+
+  for name, value in config_overrides.items():
+    if name not in overridable_settings:
+      raise Exception(f"unknown setting '{name}' in {arguments.config}")
+    globals()[name] = value
+
+  if "addwins_rdt_number_of_additions" in config_overrides and "addwins_rdt_sleep_time_milliseconds" not in config_overrides:
+    addwins_rdt_sleep_time_milliseconds = int((500 * 1000) / addwins_rdt_number_of_additions)
+
+  dgs_filepath = this_filepath / dgs_filepath  # relative paths are relative to this script
+  print(f"applied {len(config_overrides)} settings from {arguments.config}")
+
+if arguments.non_interactive:
+  interactive = False
+
+if lazy_link_creation and peer_discovery == "beacons":
+  raise Exception("lazy_link_creation needs peer_discovery 'injected', see \"special case: lazy links\"")
+
 # WARNING
 # this script is custom tailored for my simulation use case and other simulations might use parts of this script because it works, 
 # but, they are probably better of writing their own script
@@ -69,11 +167,19 @@ router_rdt_top_n_neighbours = 5
 #
 # special case: underlying graph network
 #  each unique link connection must be in its own subnet
-#  we therefore add each link beforehand, with the two unqiue addresses 10.0.<subnet>.20 and 10.0.<subnet>.21
-#  (we assume there will be no more than 255 links and an error will be thrown otherwise)
+#  we therefore add each link beforehand, in its own point-to-point /30 (or /31) subnet taken from link_address_pool
+#  (10.0.0.0/8 holds about 4 million /30 links), a link keeps its subnet for the whole session, also when lazy links are torn down
+#
+# special case: lazy links
+#  with lazy_link_creation, setup only assigns the interfaces and addresses of each link (the peer urls of the injected peers use them)
+#  the link itself is added by its first 'ae', already active, so veth pairs and qdiscs only exist for pairs that have met
+#  lazy links need peer_discovery "injected": with "beacons", every node would beacon at the addresses of all its future peers from the start
+#  with lazy_link_idle_teardown_seconds, a link that stayed deactivated for that long (wall-clock) is deleted again
+#  and recreated with the same interfaces and addresses on its next 'ae'
 #
 # special case: control network
-#  this script automatically adds the control network: 172.16.0.0/24
+#  this script automatically adds the control network: control_network (default 172.16.0.0/24)
+#  the monitoring node has node id 1, so every rdt_tool reaches it at the first address of the control network
 #
 # special case: control node
 #  this script automatically adds a control node of type "MONITORING" outside the grid
@@ -84,15 +190,103 @@ router_rdt_top_n_neighbours = 5
 #  nodes are placed in a 10 by x grid evenly spaced apart solely for better visibility
 #  the node model can be specified
 #
+# special case: step index
+#  a sidecar index "<dgs-file>.index.json" (see "dgs_index.py") is built on the first run and reused while the dgs file is unchanged
+#  only the replayed step window (first_replayed_step up to cutoff_after_x_steps steps later) is read from the dgs file
+#  links added before the replayed step window start deactivated, their 'de' instructions are skipped
+#  nodes, links and the per-step schedule are precomputed in a single pass over that window (see "dgs_precompute.py")
+#  the schedule only holds links whose state actually flips in a step, so an 'ae' and 'de' of the same link within one step
+#  or an 'ae' of a link that is already active under another edge name cost no edit_link call
+#  and cached in "<dgs-dir>/cache", keyed by the dgs sha256 and the replayed step window
+#
 # special case: step x
 #  steps must not be continuous
-#  step x will be executed after approximately x seconds
-#  (step execution does not count into our wait-time)
-#  another wait-time may be specified
+#  with step_timing "trace", step x will be executed after approximately x seconds (measured from the step before the replayed window)
+#  with step_timing "fixed", the n-th replayed step will be executed after n * wait_time_per_step_seconds
+#  both are divided by replay_speedup_factor
+#  steps are scheduled on a monotonic clock, so the step execution time is subtracted from the wait-time and no drift accumulates
+#  the lateness of each step (how long after its due time it started) is printed
+#  a step only counts as applied once every link edit of it is acknowledged, this also holds for concurrent link edits
+#  (edits of the same link within one step are always sent in order)
+#  with replay_timing_log, every step is also written to replay.data in the monitoring dir (see "replay_timing.py"):
+#  scheduled and actual start, end, lateness and the latency of every rpc, and a summary (p50/p99 rpc latency, max drift) at the end
+#
+# special case: resource sampling
+#  with resource_sampling, "resource-sampler.py" runs next to the replay as its own process and writes resources.data to the monitoring dir:
+#  every resource_sampling_interval_seconds the cpu time, resident memory and open sockets of each dtnd and rdt_tool process of the session,
+#  keyed by node and process (e.g. "n1/dtnd", "n1/rdt_tool:routing"), so a slow replay can be traced back to a starved or leaking node
+#  it only reads /proc, so it costs no calls to core and does not delay the steps, with --resume it appends to resources.data
+#  it starts right before the session is instantiated, so the startup of dtnd and the rdt_tool services is recorded as well
+#
+# special case: dtnd stats
+#  with dtnd_stats, "dtn7-stats" (see "scripts/dtn7-stats") runs next to the replay as its own process and writes dtnd.data to the monitoring dir:
+#  every dtnd_stats_interval_seconds the bundles in the store, the known peers and the bundle counters of each dtnd,
+#  queried concurrently over the control network (http api, port 3000), so the store occupancy can be followed over the whole replay
+#
+# special case: fast-forward
+#  with fast_forward_idle, the wait before a step is shortened when the replay is in a quiet stretch, e.g. when
+#   no link changes for at least fast_forward_lookahead_steps step time after the previous step, and
+#   the monitoring node writes no new received or forwarded events (received.data, forwarded.data) during a probe
+#  the probe lasts the longer of the dtnd janitor and discovery intervals and is never skipped,
+#  so every quiet stretch still gets at least one janitor run and one discovery round in real time
+#  the rest of the wait is skipped, all following steps move that much earlier
+#  at most fast_forward_max_skip_seconds are skipped per quiet stretch, from one step that changes a link to the next
+#  busy stretches, where links change within the lookahead or bundles are in flight, are replayed in real time
+#  without received.data and forwarded.data in the monitoring dir nothing counts as quiet, the replay runs in real time and a warning is printed
 #
 # special case: DTN node
 #  the node model we add here is "DTN"
-#  there is also a custom mechanism to set the dtnd service configuration file dtnd.toml
+#  dtnd.toml is generated by the dtnd service (see "core_services/dtnd.py") from the session metadata, which this script sets once:
+#   dtnd.cla, dtnd.cla_port, dtnd.routing_strategy ("external", the rdtrouter routes), dtnd.janitor_interval, dtnd.discovery_interval, dtnd.db
+#   dtnd.discovery_destinations.<node name> (with peer_discovery "beacons")
+#  so configuring dtnd costs no call per node
+#
+# special case: resource limits
+#  with node_cpu_weight or node_memory_max, every process of a node (dtnd and the rdt_tool services) is started in one cgroup (v2) per node
+#  through "scripts/dtn7-node-limits", so a few busy nodes can not starve the others and the session memory stays bounded
+#  rdt_tool_max_heap additionally caps the heap of every rdt_tool process
+#  the rdt_tool startup commands of this script get the limits directly, dtnd (started by its service as is)
+#  gets them from the session metadata (limits.cpu_weight, limits.memory_max, limits.rdt_tool_max_heap, see "core_services/dtnd.py")
+#
+# special case: peer injection
+#  with peer_discovery "beacons", every potential neighbour (the far end of each link) is a discovery destination in dtnd.toml
+#  so each node beacons at all of its links every discovery_interval_milliseconds and only uses a contact once a beacon made it across
+#  with peer_discovery "injected", discovery is turned off in dtnd.toml and the replay tells dtnd about its peers directly:
+#   'ae' adds both nodes as static peers of each other, 'de' removes them again, right after the link edit
+#   through the dtnd http api on the node (curl http://127.0.0.1:3000/peers/add and /peers/del, sent with core node_command)
+#   both nodes are told at the same time, so each 'ae'/'de' takes one node_command round trip on top of its link edit
+#   (both node_commands show up in the timing log, with overlapping latencies), a failed http request is reported and the replay goes on
+#   the peer url is <dtnd_cla>://<address of the peer on this link>:<dtnd_cla_port>/<peer node name>
+#  a contact is then usable as soon as its step is applied, without beacon traffic
+#
+# special case: parallel setup
+#  node ids, grid positions and interfaces are assigned upfront in a fixed order, so they do not depend on call timing
+#  each node is added and configured by one task, each link is added as soon as both its nodes exist
+#  instead of toggling the "rdtclient" service default around each client node, the node services are sent with the node
+#
+# special case: compiled scenario
+#  with setup_mode "scenario", nodes, services, startups, the dtnd session metadata, links and the control network are compiled into a CORE xml scenario
+#  (see "core_scenario.py") which is loaded with a single open_xml call, the replay reads a precompiled link toggle schedule next to it
+#  both are cached in "<dgs-dir>/cache", keyed by the dgs sha256, the replayed step window and a digest of the run parameters
+#  compiling needs no calls to core, a cached scenario needs no setup calls at all
+#
+# special case: warm session
+#  with warm_session, the session is left running at the end and recorded in "<dgs-dir>/cache/warm-session-<control-network>.json"
+#  the next warm run with the same topology (trace, replayed step window, client nodes, dtnd settings, link addresses) reuses it:
+#   all links are reset to 100% loss (lazy links are deleted), the rdt_tool services get their new startup commands,
+#   rdtclient, rdtrouter and rdtmonitoring are stopped, dtnd is restarted (db = "mem", so it starts empty) and the rdt_tool services are started again
+#   (each only once the services it connects to pass their validate commands, like at session start)
+#  a recorded session with a different topology is deleted and a new one is set up
+#  only the rdt_tool settings (rdt_variant, router_variant, client modes, monitoring_dir, ...) may change between warm runs
+#
+# special case: checkpoint and resume
+#  with checkpoint_replay, "<dgs-dir>/cache/checkpoint-<control-network>.json" is rewritten after every replayed step with
+#  the session id, the topology digest (see warm session), the last replayed step and the number of steps replayed so far
+#  it is removed once the replay is finished, so a leftover checkpoint means the run did not get to the end
+#  with --resume (and the same settings), setup is skipped and the replay continues in the still running session of the checkpoint:
+#   the link states are read back from core and every link that differs from its state after the checkpointed step is fixed
+#   (this also covers a step that was only partially applied before the crash), then the replay continues with the next step
+#   which is scheduled relative to the checkpointed step, replay.data is appended to
 
 
 class ID_Counter:
@@ -105,11 +299,34 @@ class ID_Counter:
     return self.counter
 
 
+class Subnet_Allocator:
+
+  def __init__(self, pool, prefix_length) -> None:
+    self.pool = ipaddress.ip_network(pool)
+    self.prefix_length = prefix_length
+    self.subnet_size = 2 ** (self.pool.max_prefixlen - prefix_length)
+    self.num_subnets = 2 ** (prefix_length - self.pool.prefixlen)
+    self.next_subnet_index = 0
+
+    if prefix_length not in (30, 31) or prefix_length < self.pool.prefixlen:
+      raise Exception(f"cannot split {self.pool} into point-to-point /{prefix_length} subnets")
+
+  def allocate(self):
+    if self.next_subnet_index >= self.num_subnets:
+      raise Exception(f"cannot assign more than {self.num_subnets} links from {self.pool}")
+
+    subnet_index = self.next_subnet_index
+    self.next_subnet_index += 1
+
+    return ipaddress.ip_network((int(self.pool.network_address) + subnet_index * self.subnet_size, self.prefix_length))
+
+
 class Interface_Creator:
 
   def __init__(self) -> None:
-    self.net_id_counter = ID_Counter(0)
+    self.subnet_allocator = Subnet_Allocator(link_address_pool, link_prefix_length)
     self.interface_counters = {}
+    self.link_addresses = {}  # structure: (node1_id, node2_id) -> (node1 address, node2 address)
   
   def get_interfaces(self, node1_id, node2_id):
     if node1_id not in self.interface_counters:
@@ -117,311 +334,813 @@ class Interface_Creator:
     if node2_id not in self.interface_counters:
       self.interface_counters[node2_id] = ID_Counter(0)
     
-    net_id = self.net_id_counter.next()
+    subnet = self.subnet_allocator.allocate()
+    node1_address, node2_address = (str(address) for address in list(subnet.hosts())[:2])
 
-    if net_id > 255:
-      raise Exception("cannot assign more than 255 links in total")
+    self.link_addresses[(node1_id, node2_id)] = (node1_address, node2_address)
 
     return (
-      Interface(id=self.interface_counters[node1_id].next(), mac=random_mac(), ip4=f"10.0.{net_id}.20", ip4_mask=24),
-      Interface(id=self.interface_counters[node2_id].next(), mac=random_mac(), ip4=f"10.0.{net_id}.21", ip4_mask=24)
+      Interface(id=self.interface_counters[node1_id].next(), mac=random_mac(), ip4=node1_address, ip4_mask=self.subnet_allocator.prefix_length),
+      Interface(id=self.interface_counters[node2_id].next(), mac=random_mac(), ip4=node2_address, ip4_mask=self.subnet_allocator.prefix_length)
     )
 
+  def get_peer_address(self, node_id, peer_id):
+    node1_address, node2_address = self.link_addresses[(min(node_id, peer_id), max(node_id, peer_id))]
+    return node2_address if node_id < peer_id else node1_address
 
-class Dtnd_Configfile_Helper:
+
+class Dtnd_Config_Helper:
 
   def __init__(self) -> None:
-    self.configs = {}
     self.discovery_addresses = {}
 
-  def add_node(self, node_id, file_contents):
-    self.configs[node_id] = file_contents
-  
   def add_discovery_address(self, node_id, address):
     if node_id not in self.discovery_addresses:
       self.discovery_addresses[node_id] = []
     self.discovery_addresses[node_id].append(address)
-  
-  def _substitute_config_file(self, node_id):
-    file_contents = self.configs[node_id]
-
-    #file_contents = re.sub(r'debug = false', 'debug = true', file_contents, 1)
-    file_contents = re.sub(r'cla.0.id = "mtcp"', f'cla.0.id = "{dtnd_cla}"', file_contents, 1)
-    file_contents = re.sub(r'strategy = "epidemic"', 'strategy = "external"', file_contents, 1)
-    file_contents = re.sub(r'interval = "2s"', f'interval = "{discovery_interval_milliseconds}ms"', file_contents, 1)
-    file_contents = re.sub(r'janitor = "10s"', f'janitor = "{janitor_interval_milliseconds}ms"', file_contents, 1)
 
-    discovery_string = "[discovery_destinations]\n"
-    for idx, address in enumerate(self.discovery_addresses[node_id]):
-      discovery_string += f'target.{idx}.destination = "{address}"\n'
-    file_contents = re.sub(r'# \[discovery_destinations\]\n', discovery_string, file_contents)
+  # the dtnd.toml settings of every node, rendered by the dtnd service
+  def get_session_metadata(self, node_names):
+    metadata = {
+      "dtnd.cla": dtnd_cla,
+      "dtnd.cla_port": str(dtnd_cla_port),
+      "dtnd.routing_strategy": "external",
+      "dtnd.janitor_interval": f"{janitor_interval_milliseconds}ms",
+      "dtnd.db": "mem"
+    }
+
+    if peer_discovery == "injected":
+      metadata["dtnd.discovery_interval"] = "0s"  # 0 deactivates discovery
+    elif peer_discovery == "beacons":
+      metadata["dtnd.discovery_interval"] = f"{discovery_interval_milliseconds}ms"
+      for node_id, addresses in self.discovery_addresses.items():
+        metadata[f"dtnd.discovery_destinations.{node_names[node_id]}"] = ",".join(addresses)
+    else:
+      raise Exception(f"unknown peer discovery '{peer_discovery}'")
 
-    self.configs[node_id] = file_contents
-  
-  def get_substituted_config_files(self):
-    for node_id in self.configs:
-      self._substitute_config_file(node_id)
-    return self.configs
+    return metadata
 
 
 grid_node_counter = ID_Counter(0)
 global_node_counter = ID_Counter(1)
 interface_creator = Interface_Creator()
-dtnd_configfile_helper = Dtnd_Configfile_Helper()
+dtnd_config_helper = Dtnd_Config_Helper()
 
 
-with open(dgs_filepath, "rt", encoding="utf8") as f:
-  dgs_lines = f.read().split("\n")
+dgs_index = DgsIndex.load_or_build(dgs_filepath)  # sidecar step index, lets us read the replayed step window directly
+last_replayed_step = first_replayed_step + cutoff_after_x_steps - 1
+print(f"dgs file opened, replaying steps {first_replayed_step} to {min(last_replayed_step, len(dgs_index) - 1)} ({dgs_index.events_in(first_replayed_step, last_replayed_step)} events)")
 
+# participating nodes, unique links and activation schedule in one pass (cached per dgs hash and replayed steps)
+replay_plan = ReplayPlan.load_or_compute(dgs_index, first_replayed_step, cutoff_after_x_steps)
+print(f"replay plan: {len(replay_plan.node_names)} nodes, {len(replay_plan.links)} links, {len(replay_plan.schedule)} steps")
+print(f"coalesced {replay_plan.num_trace_events} link events into {replay_plan.num_link_edits} link edits, saving {replay_plan.num_trace_events - replay_plan.num_link_edits} edit_link calls")
 
-file_version = dgs_lines.pop(0)
-if file_version != "DGS004":
-  raise Exception(f"file version is '{file_version}' but only 'DGS004' is supported")
 
+core = client.CoreGrpcClient(address=core_address)
+core.connect()
+print("connected to core")
 
-file_header = dgs_lines.pop(0)  # ignore, because we dont set a session name and do not care about step-numbers or event-numbers
-print("dgs file opened")
 
+# the session metadata the services read their resource limits from
+def get_limits_metadata():
+  limits_metadata = {}
 
-core = client.CoreGrpcClient()
-core.connect()
+  if node_cpu_weight is not None:
+    limits_metadata["limits.cpu_weight"] = str(node_cpu_weight)
+  if node_memory_max is not None:
+    limits_metadata["limits.memory_max"] = str(node_memory_max)
+  if rdt_tool_max_heap is not None:
+    limits_metadata["limits.rdt_tool_max_heap"] = str(rdt_tool_max_heap)
 
-session_id = core.create_session().session_id
+  return limits_metadata
 
-core.set_session_state(session_id, SessionState.CONFIGURATION)
-print("connected to core")
+# the same command the rdt_tool services start by default (see "core_services/node_limits.py")
+def get_rdt_tool_command():
+  return get_limited_rdt_tool(get_limits_metadata())
 
+def get_rdt_monitoring_startup():
+  if monitoring_dir is None:
+    return f"bash -c '{get_rdt_tool_command()} -m monitoring &> monitoring.log'"
+  else:
+    return f"bash -c '{get_rdt_tool_command()} -m monitoring -md {monitoring_dir} &> monitoring.log'"
 
-service_defaults = {}
-for existing_default in core.get_service_defaults(session_id).defaults:
-  service_defaults[existing_default.node_type] = existing_default.services
-service_defaults["DTN"] = ["DefaultMulticastRoute", "dtnd", "rdtrouter"]
-service_defaults["MONITORING"] = ["rdtmonitoring"]
+def get_rdt_client_startup(node_name):
+  additional_config = " "
 
-core.set_service_defaults(session_id, service_defaults)
-print("set service defaults for nodes")
+  if rdt_variant == "addwins" or rdt_variant == "observeremove":
+    additional_config = f"-awa {addwins_rdt_number_of_additions} -awt {addwins_rdt_sleep_time_milliseconds} "
+  
+  return f"bash -c '{get_rdt_tool_command()} -m client -cr {rdt_variant}.{clients[node_name]} -cm {rdt_client_operation_mode} {additional_config}-ma {monitoring_address} &> client.log'"
 
+def get_rdt_router_startup():
+  if router_variant == "rdt":
+    return f"bash -c '{get_rdt_tool_command()} -m routing -rs {router_variant} -rrn {router_rdt_n_total_nodes} -rrt {router_rdt_top_n_neighbours} -ma {monitoring_address} &> routing.log'"
+  else:
+    return f"bash -c '{get_rdt_tool_command()} -m routing -rs {router_variant} -ma {monitoring_address} &> routing.log'"
 
-core.set_session_options(session_id, {'controlnet': '172.16.0.0/24'})
-print("added control network 172.16.0.0/24")
+def get_dtn_node_services(node_name):
+  services = list(dtn_node_services)
+  if node_name in clients:
+    services.append("rdtclient")
+  return services
 
-monitoring_node_id = global_node_counter.next()
-core.add_node(session_id, Node(id=monitoring_node_id, name="control", type=NodeType.DEFAULT, model="MONITORING", position=Position(x=50, y=50)))
-core.set_node_service(session_id, monitoring_node_id, "rdtmonitoring", startup=(f"bash -c '/root/.coregui/scripts/rdt_tool -m monitoring &> monitoring.log'",))
-print ("added control node")
+def new_dtn_node(node_name, **kwargs):
+  return Node(
+    id=node_map[node_name], 
+    name=node_name,
+    type=NodeType.DEFAULT,
+    model="DTN",
+    position=node_positions[node_name],
+    **kwargs
+  )
 
+# sets the rdt services of an already added node
+def set_rdt_service_startups(node_name):
+  if node_name in clients:
+    config_str = get_rdt_client_startup(node_name)
 
-print("running setup")
+    print(f"adding rdt client to node {node_name}, config: {config_str}")
+    core.set_node_service(session_id, node_map[node_name], "rdtclient", startup=(config_str,))
+  
+  core.set_node_service(session_id, node_map[node_name], "rdtrouter", startup=(get_rdt_router_startup(),))
 
-# gathering all nodes that participate in the simulation, e.g. all nodes that to something up until step "cutoff_after_x_steps"
-def get_all_participating_nodes():
-  participating_nodes_until_cutoff = set()
-  step = -1
+def configure_dtn_node(node_name):
+  set_rdt_service_startups(node_name)
+  print(f"added node '{node_name}'")
 
-  for line in dgs_lines:
-    action, *others = line.split(" ")
+def add_dtn_node_with_services(node_name):
+  core.add_node(session_id, new_dtn_node(node_name, services=get_dtn_node_services(node_name)))
+  configure_dtn_node(node_name)
 
-    if action == "st":
-      step += 1
-    
-    if step > 0 and action == "ae":
-      participating_nodes_until_cutoff.add(others[1])
-      participating_nodes_until_cutoff.add(others[2])
+# allocates the interfaces of a link, they only depend on the order of the calls
+def allocate_link(node1_name, node2_name):
+  node_min_id = min(node_map[node1_name], node_map[node2_name])
+  node_max_id = max(node_map[node1_name], node_map[node2_name])
 
-    if step >= cutoff_after_x_steps + 1:
-      break
-  
-  return participating_nodes_until_cutoff
+  node1_iface, node2_iface = interface_creator.get_interfaces(node_min_id, node_max_id)
 
-participating_nodes_until_cutoff = get_all_participating_nodes()
+  link_iface_map[(node_min_id, node_max_id)] = (node1_iface.id, node2_iface.id)
+  link_interfaces[(node_min_id, node_max_id)] = (node1_iface, node2_iface)
+  dtnd_config_helper.add_discovery_address(node_min_id, interface_creator.get_peer_address(node_min_id, node_max_id))
+  dtnd_config_helper.add_discovery_address(node_max_id, interface_creator.get_peer_address(node_max_id, node_min_id))
 
+  return node_min_id, node_max_id, node1_iface, node2_iface
 
-line = dgs_lines.pop(0)
-if line != "st 0":
-  raise Exception(f"'step 0' is missing, where each 'an ...' should be, aborting")
+def add_link(node1_name, node2_name, node_min_id, node_max_id, node1_iface, node2_iface):
+  core.add_link(
+    session_id=session_id, 
+    node1_id=node_min_id, 
+    node2_id=node_max_id, 
+    iface1=node1_iface, 
+    iface2=node2_iface,
+    options=LinkOptions(loss=100)
+  )
+  print(f"added link betweeen '{node1_name}' and '{node2_name}'")
 
-# adding all nodes
-node_map = {}
 
-line = dgs_lines.pop(0)
-while not line.startswith("st"):
-  action, node_name, *others = line.split(" ")
-  line = dgs_lines.pop(0)
+dtn_node_services = ["DefaultMulticastRoute", "dtnd", "rdtrouter"]
 
-  if not action == "an":
-    raise Exception(f"unexpected line in setup step 0, expected 'an ..' got '{line}'")
-  
-  if node_name not in participating_nodes_until_cutoff:
-    continue
-  
+# assigning node ids and positions
+monitoring_node_id = global_node_counter.next()
+monitoring_address = str(ipaddress.ip_network(control_network).network_address + monitoring_node_id)  # core gives node x the x-th control network address
+node_map = {}
+node_positions = {}
+
+for node_name in replay_plan.node_names:
   grid_node_id = grid_node_counter.next()
   node_map[node_name] = global_node_counter.next()
-  position = Position(x=100+(grid_node_id%10)*50, y=100+int(grid_node_id/10)*50)
+  node_positions[node_name] = Position(x=100+(grid_node_id%10)*50, y=100+int(grid_node_id/10)*50)
 
-  if node_name in clients:
-    service_defaults["DTN"].append("rdtclient")
-    core.set_service_defaults(session_id, service_defaults)
+node_names = {node_id: node_name for node_name, node_id in node_map.items()}
 
-  core.add_node(session_id, Node(
-    id=node_map[node_name], 
-    name=node_name,
-    type=NodeType.DEFAULT,
-    model="DTN",
-    position=position
-  ))
+link_iface_map = {}
+link_interfaces = {}  # structure: (node_min_id, node_max_id) -> (node1 interface, node2 interface), needed to (re)create lazy links
 
-  if node_name in clients:
-    additional_config = " "
+# interfaces and discovery addresses are assigned locally in link order (the same in both setup modes)
+links = [(node1_name, node2_name, *allocate_link(node1_name, node2_name)) for node1_name, node2_name in replay_plan.links]
 
-    if rdt_variant == "addwins" or rdt_variant == "observeremove":
-      additional_config = f"-awa {addwins_rdt_number_of_additions} -awt {addwins_rdt_sleep_time_milliseconds} "
-    
-    config_str = f"bash -c '/root/.coregui/scripts/rdt_tool -m client -cr {rdt_variant}.{clients[node_name]} -cm {rdt_client_operation_mode} {additional_config}-ma 172.16.0.1 &> client.log'"
 
-    print(f"adding rdt client to node {node_name}, config: {config_str}")
-    core.set_node_service(session_id, node_map[node_name], "rdtclient", startup=(config_str,))
-    
-    service_defaults["DTN"].remove("rdtclient")
-    core.set_service_defaults(session_id, service_defaults)
-  
-  if router_variant == "rdt":
-    core.set_node_service(session_id, node_map[node_name], "rdtrouter", startup=(f"bash -c '/root/.coregui/scripts/rdt_tool -m routing -rs {router_variant} -rrn {router_rdt_n_total_nodes} -rrt {router_rdt_top_n_neighbours} -ma 172.16.0.1 &> routing.log'",))
+def setup_session_with_rpcs():
+  global session_id
+
+  session_id = core.create_session().session_id
+  print(f"created session {session_id}", flush=True)  # "run-sweep.py" deletes it when the run fails from here on
+  core.set_session_state(session_id, SessionState.CONFIGURATION)
+
+  service_defaults = {}
+  for existing_default in core.get_service_defaults(session_id).defaults:
+    service_defaults[existing_default.node_type] = existing_default.services
+  service_defaults["DTN"] = list(dtn_node_services)
+  service_defaults["MONITORING"] = ["rdtmonitoring"]
+
+  core.set_service_defaults(session_id, service_defaults)
+  print("set service defaults for nodes")
+
+
+  core.set_session_options(session_id, {'controlnet': control_network})
+  print(f"added control network {control_network}")
+
+  core.set_session_metadata(session_id, {**dtnd_config_helper.get_session_metadata(node_names), **get_limits_metadata()})
+  print("set dtnd.toml settings and resource limits for each node")
+
+  core.add_node(session_id, Node(id=monitoring_node_id, name="control", type=NodeType.DEFAULT, model="MONITORING", position=Position(x=50, y=50)))
+  core.set_node_service(session_id, monitoring_node_id, "rdtmonitoring", startup=(get_rdt_monitoring_startup(),))
+  print ("added control node")
+
+
+  print("running setup")
+
+  if not parallel_setup:
+    # adding all nodes
+    for node_name in replay_plan.node_names:
+      if node_name in clients:
+        service_defaults["DTN"].append("rdtclient")
+        core.set_service_defaults(session_id, service_defaults)
+
+      core.add_node(session_id, new_dtn_node(node_name))
+
+      if node_name in clients:
+        service_defaults["DTN"].remove("rdtclient")
+        core.set_service_defaults(session_id, service_defaults)
+
+      configure_dtn_node(node_name)
+
+    # adding all links (with 100% loss, links are reused), lazy links are only added during the replay
+    if not lazy_link_creation:
+      for link in links:
+        add_link(*link)
+  else:
+    with ThreadPoolExecutor(max_workers=max_parallel_setup_calls) as setup_executor:
+      node_futures = {node_name: setup_executor.submit(add_dtn_node_with_services, node_name) for node_name in replay_plan.node_names}
+
+      # node tasks are queued first, so a link task only ever waits for node tasks that are already running
+      def add_link_after_nodes(node1_name, node2_name, *link):
+        node_futures[node1_name].result()
+        node_futures[node2_name].result()
+        add_link(node1_name, node2_name, *link)
+
+      link_futures = [] if lazy_link_creation else [setup_executor.submit(add_link_after_nodes, *link) for link in links]
+
+      for future in [*node_futures.values(), *link_futures]:
+        future.result()
+
+
+# everything that ends up in the compiled scenario, a change of any of these compiles a new one
+scenario_params = {
+  "plan_version": PLAN_VERSION,
+  "rdt_variant": rdt_variant,
+  "clients": clients,
+  "router_variant": router_variant,
+  "rdt_client_operation_mode": rdt_client_operation_mode,
+  "dtnd_cla": dtnd_cla,
+  "dtnd_cla_port": dtnd_cla_port,
+  "peer_discovery": peer_discovery,
+  "janitor_interval_milliseconds": janitor_interval_milliseconds,
+  "discovery_interval_milliseconds": discovery_interval_milliseconds,
+  "addwins_rdt_number_of_additions": addwins_rdt_number_of_additions,
+  "addwins_rdt_sleep_time_milliseconds": addwins_rdt_sleep_time_milliseconds,
+  "router_rdt_n_total_nodes": router_rdt_n_total_nodes,
+  "router_rdt_top_n_neighbours": router_rdt_top_n_neighbours,
+  "link_address_pool": link_address_pool,
+  "link_prefix_length": link_prefix_length,
+  "lazy_link_creation": lazy_link_creation,
+  "control_network": control_network,
+  "monitoring_dir": monitoring_dir,
+  "node_cpu_weight": node_cpu_weight,
+  "node_memory_max": node_memory_max,
+  "rdt_tool_max_heap": rdt_tool_max_heap
+}
+scenario_params_digest = hashlib.sha256(json.dumps(scenario_params, sort_keys=True).encode("utf8")).hexdigest()[:16]
+scenario_filepath = dgs_filepath.parent / "cache" / f"{dgs_index.sha256}-{first_replayed_step}-{cutoff_after_x_steps}-{scenario_params_digest}.xml"
+toggles_filepath = scenario_filepath.with_suffix(".toggles.json")
+
+def compile_scenario():
+  scenario = CoreScenario(dgs_filepath.stem)
+  scenario.set_session_option("controlnet", control_network)
+  scenario.set_session_metadata({**dtnd_config_helper.get_session_metadata(node_names), **get_limits_metadata()})
+
+  scenario.add_node(monitoring_node_id, "control", "MONITORING", Position(x=50, y=50), ["rdtmonitoring"])
+  scenario.set_service_startup(monitoring_node_id, "rdtmonitoring", (get_rdt_monitoring_startup(),))
+
+  for node_name in replay_plan.node_names:
+    scenario.add_node(node_map[node_name], node_name, "DTN", node_positions[node_name], get_dtn_node_services(node_name))
+
+    if node_name in clients:
+      scenario.set_service_startup(node_map[node_name], "rdtclient", (get_rdt_client_startup(node_name),))
+    scenario.set_service_startup(node_map[node_name], "rdtrouter", (get_rdt_router_startup(),))
+
+  if not lazy_link_creation:
+    for node1_name, node2_name, *link in links:
+      scenario.add_link(*link, loss=100)
+
+  scenario.write(scenario_filepath)
+  save_link_toggles(toggles_filepath, compile_link_toggles(replay_plan.schedule, node_map))
+
+
+# everything a warm session must share with this run, the rdt_tool settings are not part of it
+topology_params = {
+  "plan_version": PLAN_VERSION,
+  "dgs_sha256": dgs_index.sha256,
+  "first_replayed_step": first_replayed_step,
+  "cutoff_after_x_steps": cutoff_after_x_steps,
+  "client_nodes": sorted(clients),
+  "dtnd_cla": dtnd_cla,
+  "dtnd_cla_port": dtnd_cla_port,
+  "peer_discovery": peer_discovery,
+  "janitor_interval_milliseconds": janitor_interval_milliseconds,
+  "discovery_interval_milliseconds": discovery_interval_milliseconds,
+  "link_address_pool": link_address_pool,
+  "link_prefix_length": link_prefix_length,
+  "lazy_link_creation": lazy_link_creation,
+  "control_network": control_network,
+  "node_cpu_weight": node_cpu_weight,  # dtnd keeps the limits it was started with
+  "node_memory_max": node_memory_max
+}
+topology_digest = hashlib.sha256(json.dumps(topology_params, sort_keys=True).encode("utf8")).hexdigest()[:16]
+warm_session_filepath = dgs_filepath.parent / "cache" / f"warm-session-{control_network.replace('/', '-')}.json"
+
+# returns the recorded warm session if it is still running with the same topology, a mismatching one is deleted
+def claim_warm_session():
+  if not warm_session_filepath.exists():
+    return None
+
+  with open(warm_session_filepath, "rt", encoding="utf8") as f:
+    warm_session_record = json.load(f)
+  warm_session_filepath.unlink()  # recorded again at the end of this run
+
+  try:
+    warm_session_state = core.get_session(warm_session_record["session_id"]).session.state
+  except grpc.RpcError:
+    return None
+
+  if warm_session_record["topology_digest"] == topology_digest and warm_session_state == SessionState.RUNTIME:
+    return warm_session_record["session_id"]
+
+  core.delete_session(warm_session_record["session_id"])
+  print(f"deleted warm session {warm_session_record['session_id']}, it is not running or does not match this run")
+  return None
+
+checkpoint_filepath = dgs_filepath.parent / "cache" / f"checkpoint-{control_network.replace('/', '-')}.json"
+
+def write_checkpoint(step, num_steps_ran):
+  temporary_checkpoint_filepath = checkpoint_filepath.with_suffix(".tmp")
+
+  with open(temporary_checkpoint_filepath, "wt", encoding="utf8") as f:
+    json.dump({
+      "session_id": session_id,
+      "topology_digest": topology_digest,
+      "step": step,
+      "num_steps_ran": num_steps_ran
+    }, f, separators=(",", ":"))
+
+  temporary_checkpoint_filepath.replace(checkpoint_filepath)  # atomic, a crash never leaves a half written checkpoint
+
+# returns the checkpoint of the crashed run, if its session is still running with the same topology
+def load_checkpoint():
+  if not checkpoint_filepath.exists():
+    raise Exception(f"cannot resume, there is no checkpoint {checkpoint_filepath}")
+
+  with open(checkpoint_filepath, "rt", encoding="utf8") as f:
+    checkpoint = json.load(f)
+
+  if checkpoint["topology_digest"] != topology_digest:
+    raise Exception(f"cannot resume, checkpoint {checkpoint_filepath.name} was written by a run with a different topology")
+
+  try:
+    checkpoint_session_state = core.get_session(checkpoint["session_id"]).session.state
+  except grpc.RpcError:
+    raise Exception(f"cannot resume, session {checkpoint['session_id']} of the checkpoint does not exist anymore")
+
+  if checkpoint_session_state != SessionState.RUNTIME:
+    raise Exception(f"cannot resume, session {checkpoint['session_id']} of the checkpoint is not running")
+
+  return checkpoint
+
+def run_service_actions(service_actions):
+  def run_service_action(node_id, service_name, action):
+    if not core.service_action(session_id, node_id, service_name, action).result:
+      print(f"service action {ServiceAction.Name(action)} of '{service_name}' on node {node_id} failed")
+
+  if not parallel_setup:
+    for service_action in service_actions:
+      run_service_action(*service_action)
+  else:
+    with ThreadPoolExecutor(max_workers=max_parallel_setup_calls) as setup_executor:
+      for future in [setup_executor.submit(run_service_action, *service_action) for service_action in service_actions]:
+        future.result()
+
+# core only runs the validate commands of a service (see "core_services") when the session starts, not for service actions,
+# so after those they are run by VALIDATE actions until they pass
+readiness_timeout_seconds = 30
+readiness_poll_seconds = 0.2
+
+def wait_until_ready(node_ids, service_name):
+  def wait_on_node(node_id):
+    deadline = time.monotonic() + readiness_timeout_seconds
+    while not core.service_action(session_id, node_id, service_name, ServiceAction.VALIDATE).result:
+      if time.monotonic() >= deadline:
+        raise Exception(f"'{service_name}' on node {node_id} was not ready after {readiness_timeout_seconds} seconds")
+      time.sleep(readiness_poll_seconds)
+
+  with ThreadPoolExecutor(max_workers=max_parallel_setup_calls if parallel_setup else 1) as probe_executor:
+    for future in [probe_executor.submit(wait_on_node, node_id) for node_id in node_ids]:
+      future.result()
+
+def reset_warm_session():
+  for link in core.get_session(session_id).session.links:
+    node_min_id, node_max_id = min(link.node1_id, link.node2_id), max(link.node1_id, link.node2_id)
+
+    if (node_min_id, node_max_id) not in link_iface_map:
+      continue
+
+    node1_iface_id, node2_iface_id = link_iface_map[(node_min_id, node_max_id)]
+
+    if lazy_link_creation:
+      core.delete_link(session_id, node_min_id, node_max_id, node1_iface_id, node2_iface_id)
+    elif link.options.loss != 100:
+      core.edit_link(session_id=session_id, node1_id=node_min_id, node2_id=node_max_id, iface1_id=node1_iface_id, iface2_id=node2_iface_id, options=LinkOptions(loss=100))
+  print("reset all links")
+
+  core.set_node_service(session_id, monitoring_node_id, "rdtmonitoring", startup=(get_rdt_monitoring_startup(),))
+  for node_name in replay_plan.node_names:
+    set_rdt_service_startups(node_name)
+
+  dtn_node_ids = [node_map[node_name] for node_name in replay_plan.node_names]
+  client_node_ids = [node_map[node_name] for node_name in replay_plan.node_names if node_name in clients]
+
+  # clients and routers hold connections to dtnd and the monitoring node, so they are stopped first and started last
+  run_service_actions([(node_id, "rdtclient", ServiceAction.STOP) for node_id in client_node_ids])
+  run_service_actions([(node_id, "rdtrouter", ServiceAction.STOP) for node_id in dtn_node_ids])
+  run_service_actions([(monitoring_node_id, "rdtmonitoring", ServiceAction.STOP)])
+  run_service_actions([(node_id, "dtnd", ServiceAction.RESTART) for node_id in dtn_node_ids])
+  wait_until_ready(dtn_node_ids, "dtnd")
+  run_service_actions([(monitoring_node_id, "rdtmonitoring", ServiceAction.START)])
+  wait_until_ready([monitoring_node_id], "rdtmonitoring")
+  run_service_actions([(node_id, "rdtrouter", ServiceAction.START) for node_id in dtn_node_ids])
+  run_service_actions([(node_id, "rdtclient", ServiceAction.START) for node_id in client_node_ids])
+  print("restarted dtnd and the rdt_tool services")
+
+
+resumed_checkpoint = load_checkpoint() if arguments.resume else None
+session_id = claim_warm_session() if warm_session and resumed_checkpoint is None else None
+reused_warm_session = session_id is not None
+
+if resumed_checkpoint is not None:
+  session_id = resumed_checkpoint["session_id"]
+  print(f"resuming session {session_id} after step {resumed_checkpoint['step']}")
+  link_toggles = compile_link_toggles(replay_plan.schedule, node_map)
+elif reused_warm_session:
+  print(f"reusing warm session {session_id}", flush=True)
+  reset_warm_session()
+  link_toggles = compile_link_toggles(replay_plan.schedule, node_map)
+elif setup_mode == "rpc":
+  setup_session_with_rpcs()
+  link_toggles = compile_link_toggles(replay_plan.schedule, node_map)
+elif setup_mode == "scenario":
+  if not scenario_filepath.exists() or not toggles_filepath.exists():
+    print(f"compiling scenario {scenario_filepath.name}")
+    compile_scenario()
   else:
-    core.set_node_service(session_id, node_map[node_name], "rdtrouter", startup=(f"bash -c '/root/.coregui/scripts/rdt_tool -m routing -rs {router_variant} -ma 172.16.0.1 &> routing.log'",))
+    print(f"loaded compiled scenario {scenario_filepath.name}")
+
+  session_id = core.open_xml(str(scenario_filepath), start=False).session_id
+  print(f"created session {session_id} from the scenario", flush=True)
+  link_toggles = load_link_toggles(toggles_filepath)
+else:
+  raise Exception(f"unknown setup mode '{setup_mode}'")
+
+print(f"setup complete, session {session_id}")
+
+
+if interactive and resumed_checkpoint is None:
+  input("press enter to start the simulation")
+
+monitoring_dirpath = pathlib.Path(rdt_tool_default_monitoring_dir if monitoring_dir is None else monitoring_dir)
+
+# processes that record the replay next to it, they are stopped at the end and also when this script fails
+# (when this script is killed, they notice it and stop on their own)
+collector_processes = []
+
+@atexit.register
+def stop_collectors():
+  while collector_processes:
+    collector = collector_processes.pop()
+    collector.terminate()
+    try:
+      collector.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+      collector.kill()
+
+if resource_sampling:
+  session_dirpath = core.get_session(session_id).session.dir
+  collector_processes.append(subprocess.Popen([
+    sys.executable, str(this_filepath / "resource-sampler.py"), str(monitoring_dirpath / "resources.data"),
+    "--session-dir", session_dirpath, "--interval", str(resource_sampling_interval_seconds), *(["--append"] if resumed_checkpoint is not None else []),
+    "--parent-pid", str(os.getpid())
+  ]))
+  print(f"sampling the dtnd and rdt_tool processes of {session_dirpath} every {resource_sampling_interval_seconds} seconds ({monitoring_dirpath / 'resources.data'})")
+
+if not reused_warm_session and resumed_checkpoint is None:
+  core.set_session_state(session_id, SessionState.INSTANTIATION)
+
+num_steps_ran = 0
+
+if resumed_checkpoint is not None:
+  num_steps_ran = resumed_checkpoint["num_steps_ran"]
+
+def edit_link(node_min_id, node_max_id, loss):
+  node1_iface_id, node2_iface_id = link_iface_map[(node_min_id, node_max_id)]
+
+  core.edit_link(
+    session_id=session_id,
+    node1_id=node_min_id,
+    node2_id=node_max_id,
+    iface1_id=node1_iface_id,
+    iface2_id=node2_iface_id,
+    options=LinkOptions(loss=loss)
+  )
+
+created_links = set()  # lazy links that currently exist in the session
+deactivated_links = {}  # structure: (node_min_id, node_max_id) -> monotonic time of the deactivation, only lazy links that exist
+
+def create_link(node_min_id, node_max_id, loss):
+  node1_iface, node2_iface = link_interfaces[(node_min_id, node_max_id)]
+
+  core.add_link(
+    session_id=session_id,
+    node1_id=node_min_id,
+    node2_id=node_max_id,
+    iface1=node1_iface,
+    iface2=node2_iface,
+    options=LinkOptions(loss=loss)
+  )
+  created_links.add((node_min_id, node_max_id))
+
+def delete_link(node_min_id, node_max_id):
+  node1_iface_id, node2_iface_id = link_iface_map[(node_min_id, node_max_id)]
+
+  core.delete_link(session_id, node_min_id, node_max_id, node1_iface_id, node2_iface_id)
+  created_links.discard((node_min_id, node_max_id))
+
+# returns the name of the rpc that was sent, None if nothing had to be sent
+def set_link_loss(node_min_id, node_max_id, loss):
+  if not lazy_link_creation or (node_min_id, node_max_id) in created_links:
+    edit_link(node_min_id, node_max_id, loss)
+    return "edit_link"
+  elif loss < 100:
+    create_link(node_min_id, node_max_id, loss)
+    return "add_link"
+  # a lazy link that does not exist (yet or anymore) is already deactivated
+  return None
+
+# makes the dtnd of both nodes add (loss < 100) or remove each other as static peer, through the dtnd http api on the node
+def inject_peers(node_min_id, node_max_id, loss, rpc_timings):
+  def inject_peer(node_id, peer_id):
+    peer_url = urllib.parse.quote(f"{dtnd_cla}://{interface_creator.get_peer_address(node_id, peer_id)}:{dtnd_cla_port}/{node_names[peer_id]}", safe="")
+    peers_path = f"peers/add?p={peer_url}&p_t=STATIC" if loss < 100 else f"peers/del?p={peer_url}"
+
+    rpc_started = time.monotonic()
+    # -f: an http error of dtnd fails curl as well
+    if core.node_command(session_id, node_id, f"curl -sf -o /dev/null -m 5 'http://127.0.0.1:3000/{peers_path}'", wait=True).return_code != 0:
+      print(f"could not {'add' if loss < 100 else 'remove'} peer {node_names[peer_id]} at dtnd of node {node_id}")
+    rpc_timings.append(("node_command", node_min_id, node_max_id, loss, time.monotonic() - rpc_started))
+
+  futures = [peer_injection_executor.submit(inject_peer, node_id, peer_id) for node_id, peer_id in ((node_min_id, node_max_id), (node_max_id, node_min_id))]
+  for future in futures:
+    future.result()
+
+# appends (rpc, node_min_id, node_max_id, loss, latency) of every sent rpc to rpc_timings
+def edit_links_in_order(link_edits, rpc_timings):
+  for node_min_id, node_max_id, loss in link_edits:
+    rpc_started = time.monotonic()
+    rpc = set_link_loss(node_min_id, node_max_id, loss)
+
+    if rpc is not None:
+      rpc_timings.append((rpc, node_min_id, node_max_id, loss, time.monotonic() - rpc_started))
+
+    if peer_discovery == "injected":
+      inject_peers(node_min_id, node_max_id, loss, rpc_timings)
+
+# deletes lazy links that stayed deactivated for lazy_link_idle_teardown_seconds, returns how many
+def teardown_idle_links(link_edits, now, rpc_timings):
+  for node_min_id, node_max_id, loss in link_edits:
+    if loss == 100 and (node_min_id, node_max_id) in created_links:
+      deactivated_links.setdefault((node_min_id, node_max_id), now)
+    else:
+      deactivated_links.pop((node_min_id, node_max_id), None)
 
-  dtnd_toml_contents = core.get_node_service_file(session_id, node_map[node_name], "dtnd", "dtnd.toml").data
-  dtnd_configfile_helper.add_node(node_map[node_name], dtnd_toml_contents)
-  print(f"added node '{node_name}'")
+  idle_links = [link for link, deactivated_at in deactivated_links.items() if now - deactivated_at >= lazy_link_idle_teardown_seconds]
+  for link in idle_links:
+    rpc_started = time.monotonic()
+    delete_link(*link)
+    rpc_timings.append(("delete_link", *link, 100, time.monotonic() - rpc_started))
+    del deactivated_links[link]
 
-# adding all links (with 100% loss, links are reused)
-def add_all_links():
-  link_iface_map = {}
-  step = -1
+  return len(idle_links)
 
-  for line in dgs_lines:
-    if line.startswith("st"):
-      step += 1
-    
-    if step >= cutoff_after_x_steps + 1:
-      break
-
-    if line.startswith("ae"):
-      action, link_name, node1_name, node2_name, *other = line.split(" ")
-
-      if node1_name not in participating_nodes_until_cutoff or node2_name not in participating_nodes_until_cutoff:
-        break
-
-      node_min_id = min(node_map[node1_name], node_map[node2_name])
-      node_max_id = max(node_map[node1_name], node_map[node2_name])
-
-      if (node_min_id, node_max_id) not in link_iface_map:
-        node1_iface, node2_iface = interface_creator.get_interfaces(node_min_id, node_max_id)
-
-        core.add_link(
-          session_id=session_id, 
-          node1_id=node_min_id, 
-          node2_id=node_max_id, 
-          iface1=node1_iface, 
-          iface2=node2_iface,
-          options=LinkOptions(loss=100)
-        )
-
-        link_iface_map[(node_min_id, node_max_id)] = (node1_iface.id, node2_iface.id)
-        dtnd_configfile_helper.add_discovery_address(node_min_id, node2_iface.ip4)
-        dtnd_configfile_helper.add_discovery_address(node_max_id, node1_iface.ip4)
-        print(f"added link betweeen '{node1_name}' and '{node2_name}'")
-  
-  return link_iface_map
+link_edit_executor = ThreadPoolExecutor(max_workers=max_concurrent_link_edits) if concurrent_link_edits else None
+# sends the two node_commands of each peer injection at the same time, for every link edited at the same time
+peer_injection_executor = ThreadPoolExecutor(max_workers=2 * (max_concurrent_link_edits if concurrent_link_edits else 1)) if peer_discovery == "injected" else None
 
-link_iface_map = add_all_links()
+# returns once every link edit is acknowledged, with the timings of the sent rpcs
+def apply_link_edits(link_edits):
+  rpc_timings = []
 
+  if link_edit_executor is None:
+    edit_links_in_order(link_edits, rpc_timings)
+    return rpc_timings
 
-# editing dtnd.toml
-for node_id, file_contents in dtnd_configfile_helper.get_substituted_config_files().items():
-  core.set_node_service_file(session_id, node_id, "dtnd", "dtnd.toml", file_contents)
-print(f"updated dtnd.toml for each node")
+  link_edits_per_link = {}
+  for link_edit in link_edits:
+    link_edits_per_link.setdefault(link_edit[:2], []).append(link_edit)
 
-print("setup complete")
+  futures = [link_edit_executor.submit(edit_links_in_order, edits, rpc_timings) for edits in link_edits_per_link.values()]
+  for future in futures:
+    future.result()
 
+  return rpc_timings
 
-input("press enter to start the simulation")
-core.set_session_state(session_id, SessionState.INSTANTIATION)
+# the link edits that bring the session links to their state after the replayed steps
+def get_reconciling_link_edits(replayed_link_toggles):
+  expected_losses = {}  # structure: (node_min_id, node_max_id) -> loss, links that were never activated are missing (100)
 
-num_steps_ran = -1
-last_step = 0
-link_name_map = {}
+  for step, events in replayed_link_toggles:
+    for action, link_name, node_min_id, node_max_id in events:
+      expected_losses[(node_min_id, node_max_id)] = 0 if action == "ae" else 100
 
-while True:
-  num_steps_ran += 1
+  actual_losses = {}  # structure: (node_min_id, node_max_id) -> loss, lazy links that do not exist are missing (100)
 
-  if num_steps_ran >= cutoff_after_x_steps:
-    print(f"ran {num_steps_ran} steps. reached cutoff max. break here.")
-    break
+  for link in core.get_session(session_id).session.links:
+    node_min_id, node_max_id = min(link.node1_id, link.node2_id), max(link.node1_id, link.node2_id)
 
-  action, step, *others = line.split(" ")
-  step = int(step)
+    if (node_min_id, node_max_id) in link_iface_map:
+      actual_losses[(node_min_id, node_max_id)] = link.options.loss
 
-  if not action == "st":
-    raise Exception(f"unexpected line, expected 'st ..' got '{line}'")
-  
-  #print(f"waiting {step-last_step} steps, resulting wait-time seconds: {(step - last_step)*wait_time_per_step_seconds}")
-  #time.sleep((step - last_step)*wait_time_per_step_seconds)
-  print(f"waiting predefined seconds: {wait_time_per_step_seconds}")
-  time.sleep(wait_time_per_step_seconds)
-  last_step = step
-  #input(f"press enter to run step {step}")
+  if lazy_link_creation:
+    created_links.update(actual_losses)
 
-  line = dgs_lines.pop(0)
+  return [(*link, expected_losses.get(link, 100)) for link in {**expected_losses, **actual_losses} if expected_losses.get(link, 100) != actual_losses.get(link, 100)]
 
-  while not line.startswith("st"):
-    action, link_name, *others = line.split(" ")
 
-    if action == "ae":
-      node1_name, node2_name = others
+if resumed_checkpoint is not None:
+  reconciling_link_edits = get_reconciling_link_edits(link_toggles[:num_steps_ran])
+  apply_link_edits(reconciling_link_edits)
+  print(f"reconciled {len(reconciling_link_edits)} links with their state after step {resumed_checkpoint['step']}")
 
-      node_min_id = min(node_map[node1_name], node_map[node2_name])
-      node_max_id = max(node_map[node1_name], node_map[node2_name])
+  link_toggles = link_toggles[num_steps_ran:]
 
-      node1_iface_id, node2_iface_id = link_iface_map[(node_min_id, node_max_id)]
+if step_timing == "trace":
+  origin_step_number = dgs_index.step_numbers[first_replayed_step - 1] if resumed_checkpoint is None else resumed_checkpoint["step"]
+  scheduler = StepScheduler(1.0, replay_speedup_factor, origin_step_number)
+elif step_timing == "fixed":
+  scheduler = StepScheduler(wait_time_per_step_seconds, replay_speedup_factor, num_steps_ran)
+else:
+  raise Exception(f"unknown step timing '{step_timing}'")
 
-      core.edit_link(
-        session_id=session_id,
-        node1_id=node_min_id,
-        node2_id=node_max_id,
-        iface1_id=node1_iface_id,
-        iface2_id=node2_iface_id,
-        options=LinkOptions(loss=0)
-      )
+timing_log = None
+if replay_timing_log:
+  timing_log = ReplayTimingLog(monitoring_dirpath / "replay.data", append=resumed_checkpoint is not None)
 
-      link_name_map[link_name] = (node_min_id, node_max_id)
-    
-      print(f"activated link {link_name} between {node_min_id} and {node_max_id}")
+if dtnd_stats:
+  collector_processes.append(subprocess.Popen([
+    "dtn7-stats", "--session", str(session_id), "--core-address", core_address, "--control-network", control_network,
+    "--interval", str(dtnd_stats_interval_seconds), "--output", str(monitoring_dirpath / "dtnd.data"), *(["--append"] if resumed_checkpoint is not None else []),
+    "--parent-pid", str(os.getpid())
+  ]))
+  print(f"collecting the dtnd stats of session {session_id} every {dtnd_stats_interval_seconds} seconds ({monitoring_dirpath / 'dtnd.data'})")
+
+# the step time of the first step from each step on that changes a link, infinite if none follows
+def get_next_busy_step_times(step_times):
+  next_busy_step_times = []
+  next_busy_step_time = math.inf
+
+  for step_time, (step, events) in reversed(list(zip(step_times, link_toggles))):
+    if events:
+      next_busy_step_time = step_time
+    next_busy_step_times.append(next_busy_step_time)
+
+  return next_busy_step_times[::-1]
+
+# None while the monitoring node has not written its output (yet), e.g. when monitoring_dir is not where rdt_tool writes
+def get_monitoring_sizes():
+  monitoring_filepaths = [monitoring_dirpath / filename for filename in ("received.data", "forwarded.data")]
+
+  if not all(monitoring_filepath.exists() for monitoring_filepath in monitoring_filepaths):
+    return None
+  return [monitoring_filepath.stat().st_size for monitoring_filepath in monitoring_filepaths]
+
+missing_monitoring_output_reported = False
+
+# probes the monitoring output and skips the rest of the wait for the step (at most max_skip_seconds) if nothing was received or forwarded,
+# returns the skipped seconds
+def fast_forward_quiet_stretch(step, step_time, max_skip_seconds):
+  probe_seconds = max(janitor_interval_milliseconds, discovery_interval_milliseconds) / 1000
+
+  if max_skip_seconds <= 0 or scheduler.time_until(step_time) <= probe_seconds:
+    return 0.0
+
+  monitoring_sizes = get_monitoring_sizes()
+  if monitoring_sizes is None:
+    global missing_monitoring_output_reported
+    if not missing_monitoring_output_reported:
+      print(f"warning: not fast-forwarding, there is no received.data and forwarded.data in {monitoring_dirpath} to tell quiet stretches apart")
+      missing_monitoring_output_reported = True
+    return 0.0
+
+  time.sleep(probe_seconds)
+  if get_monitoring_sizes() != monitoring_sizes:
+    return 0.0
+
+  skipped_seconds = min(max_skip_seconds, scheduler.time_until(step_time))
+  scheduler.fast_forward(skipped_seconds)
+  print(f"fast-forwarded {skipped_seconds:.3f} seconds of a quiet stretch before step {step}")
+
+  return skipped_seconds
+
+step_times = [step if step_timing == "trace" else num_steps_ran + step_index for step_index, (step, events) in enumerate(link_toggles, 1)]
+next_busy_step_times = get_next_busy_step_times(step_times)
+previous_step_time = scheduler.origin_step_time
+fast_forwarded_seconds = 0.0
+stretch_fast_forwarded_seconds = 0.0  # skipped since the last step that changed a link
+
+scheduler.start()
+
+if replay_plan.skipped_delete_edges > 0:
+  print(f"skipping {replay_plan.skipped_delete_edges} link deactivations of links added before the replayed steps")
+
+for step_time, next_busy_step_time, (step, events) in zip(step_times, next_busy_step_times, link_toggles):
+  num_steps_ran += 1
+
+  if fast_forward_idle and next_busy_step_time - previous_step_time >= fast_forward_lookahead_steps:
+    skipped_seconds = fast_forward_quiet_stretch(step, step_time, fast_forward_max_skip_seconds - stretch_fast_forwarded_seconds)
+    stretch_fast_forwarded_seconds += skipped_seconds
+    fast_forwarded_seconds += skipped_seconds
+  if events:
+    stretch_fast_forwarded_seconds = 0.0
+  previous_step_time = step_time
+
+  print(f"waiting {max(0.0, scheduler.time_until(step_time)):.3f} seconds for step {step}")
+  lateness = scheduler.wait_for(step_time)
+  step_started = time.monotonic()
+  #input(f"press enter to run step {step}")
+
+  link_edits = []
+  messages = []
+
+  for action, link_name, node_min_id, node_max_id in events:
+    if action == "ae":
+      link_edits.append((node_min_id, node_max_id, 0))
+      messages.append(f"activated link {link_name} between {node_min_id} and {node_max_id}")
     elif action == "de":
-      node_min_id, node_max_id = link_name_map[link_name]
+      link_edits.append((node_min_id, node_max_id, 100))
+      messages.append(f"deactivated link {link_name} between {node_min_id} and {node_max_id}")
 
-      node1_iface_id, node2_iface_id = link_iface_map[(node_min_id, node_max_id)]
+  rpc_timings = apply_link_edits(link_edits)
 
-      core.edit_link(
-        session_id=session_id,
-        node1_id=node_min_id,
-        node2_id=node_max_id,
-        iface1_id=node1_iface_id,
-        iface2_id=node2_iface_id,
-        options=LinkOptions(loss=100)
-      )
+  if lazy_link_creation and lazy_link_idle_teardown_seconds is not None:
+    num_deleted_links = teardown_idle_links(link_edits, time.monotonic(), rpc_timings)
+    if num_deleted_links > 0:
+      messages.append(f"deleted {num_deleted_links} idle links, {len(created_links)} links exist")
 
-      print(f"deactivated link {link_name} between {node_min_id} and {node_max_id}")
-    else:
-      raise Exception(f"unknown action '{line}'")
+  for message in messages:
+    print(message)
 
-    if len(dgs_lines) > 0:
-      line = dgs_lines.pop(0)
-    else:
-      break
+  step_ended = time.monotonic()
+  if timing_log is not None:
+    timing_log.write_step(step, scheduler.due_time(step_time), step_started, step_ended, rpc_timings)
 
-  if len(dgs_lines) <= 0:
-    break
+  print(f"step {step} started {lateness * 1000:.1f}ms late, took {(step_ended - step_started) * 1000:.1f}ms")
+
+  if checkpoint_replay:
+    write_checkpoint(step, num_steps_ran)
+
+if link_edit_executor is not None:
+  link_edit_executor.shutdown()
+
+checkpoint_filepath.unlink(missing_ok=True)
+
+stop_collectors()
+
+if timing_log is not None:
+  timing_summary = timing_log.close()
+  print(f"replay timing: {timing_summary['rpcs']} rpcs, latency p50 {timing_summary['rpc_latency_p50_ms']}ms, p99 {timing_summary['rpc_latency_p99_ms']}ms, max drift {timing_summary['max_drift_ms']}ms ({timing_log.filepath})")
+
+if fast_forward_idle:
+  print(f"fast-forwarded {fast_forwarded_seconds:.1f} seconds of quiet stretches")
+
+if num_steps_ran >= cutoff_after_x_steps:
+  print(f"ran {num_steps_ran} steps. reached cutoff max. break here.")
 
-print("reached end of simulation, shutting down")
-core.set_session_state(session_id, SessionState.SHUTDOWN)
+if warm_session:
+  warm_session_filepath.parent.mkdir(parents=True, exist_ok=True)
+  with open(warm_session_filepath, "wt", encoding="utf8") as f:
+    json.dump({"session_id": session_id, "topology_digest": topology_digest}, f)
+  print(f"reached end of simulation, keeping session {session_id} warm")
+else:
+  print("reached end of simulation, shutting down")
+  core.set_session_state(session_id, SessionState.SHUTDOWN)
+  if delete_session_at_end:
+    core.delete_session(session_id)
+    print(f"deleted session {session_id}")
 print("done")
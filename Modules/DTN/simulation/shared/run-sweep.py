@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+import argparse
+import itertools
+import json
+import os
+import pathlib
+import queue
+import re
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import grpc
+from core.api.grpc import client
+
+
+this_filepath = pathlib.Path(__file__).parent.resolve()
+
+run_dgs_filepath = this_filepath / "run-dgs.py"
+monitoring_dirpath = pathlib.Path("/shared/monitoring")  # written by the monitoring node, the rdt_tool default (see "run-dgs.py")
+archive_dirpath = this_filepath / "archive"
+run_timeout_seconds = None  # a run that takes longer is killed and counted as failed, None waits forever
+parallel_sessions = 1  # runs executed at the same time, each in its own session, capped by the estimates below (can be set in the sweep spec)
+cpus_per_session = 4  # estimated cores a session keeps busy
+memory_per_session_megabytes = 4096  # estimated memory a session needs (dtnd and rdt_tool processes of every node)
+
+
+# runs every point of a parameter sweep back to back with "run-dgs.py", without any interaction
+#
+# usage: run-sweep.py <sweep-spec.json>
+#
+# sweep spec:
+#  {
+#    "name": "rdt-router-selection-arguing",                         -> archive/<name>/
+#    "repetitions": 3,                                               -> every point is run this often (default 1)
+#    "settings": {"cutoff_after_x_steps": 600, "step_timing": "trace"},  -> applied to every point
+#    "matrix": {"router_variant": ["epidemic", "rdt"], "router_rdt_top_n_neighbours": [5, 10]},  -> every combination is a point
+#    "point_name": "{router_variant}-{router_rdt_top_n_neighbours}t"  -> optional, may use matrix and settings names, default: the matrix values joined by '-'
+#  }
+#
+# each run ends up in archive/<name>/<point-name>/ (the layout the plotting scripts expect, they read the point name) with
+#  config.json      the run-dgs.py settings of the run
+#  run-dgs.log      the output of run-dgs.py
+#  *.data           the monitoring output of the run (the files in the monitoring dir written while it ran)
+#  done             only written for successful runs, runs that have it are skipped when the sweep is started again
+# with more than one repetition, each repetition gets its own level: archive/<name>/r<repetition>/<point-name>/
+#
+# the monitoring node truncates its output files when it starts, so nothing has to be cleaned up between runs
+# run-dgs.py shuts down and deletes its session at the end, if a run fails its session is deleted here
+#
+# parallel sessions:
+#  with "parallel_sessions": n in the sweep spec, up to n runs are executed at the same time
+#  n is capped by the cpu count and the available memory (MemAvailable) divided by the per session estimates above
+#  every concurrent run holds a slot k in 0..n-1, which gives it its own
+#   control network  172.16.k.0/24 (with the monitoring node at 172.16.k.1)
+#   monitoring dir   monitoring/slot-k
+#  with a single slot the default control network and monitoring dir are kept
+#
+# warm sessions:
+#  with "warm_session": true in the settings, consecutive runs of a slot reuse its session (see "run-dgs.py")
+#  so points should only differ in rdt_tool settings, the warm sessions are deleted once the sweep is finished
+
+
+def get_points(sweep_spec):
+  matrix = sweep_spec.get("matrix", {})
+  names = list(matrix)
+
+  for values in itertools.product(*(matrix[name] for name in names)):
+    point = dict(zip(names, values))
+
+    if "point_name" in sweep_spec:
+      point_name = sweep_spec["point_name"].format(**sweep_spec.get("settings", {}), **point)
+    else:
+      point_name = "-".join(str(value) for value in values) or "default"
+
+    yield point_name, point
+
+
+def get_session_capacity():
+  capacity_by_cpu = (os.cpu_count() or 1) // cpus_per_session
+
+  with open("/proc/meminfo", "rt", encoding="utf8") as f:
+    memory_available_kilobytes = next(int(line.split()[1]) for line in f if line.startswith("MemAvailable:"))
+  capacity_by_memory = memory_available_kilobytes // (memory_per_session_megabytes * 1024)
+
+  return max(1, min(capacity_by_cpu, capacity_by_memory))
+
+
+def get_run_dirpath(point_name, repetition):
+  if repetitions == 1:
+    return sweep_dirpath / point_name
+  return sweep_dirpath / f"r{repetition}" / point_name
+
+
+def get_slot_settings(slot, num_slots):
+  if num_slots == 1:
+    return {}, monitoring_dirpath
+
+  slot_monitoring_dirpath = monitoring_dirpath / f"slot-{slot}"
+  slot_monitoring_dirpath.mkdir(parents=True, exist_ok=True)
+
+  return {"control_network": f"172.16.{slot}.0/24", "monitoring_dir": str(slot_monitoring_dirpath)}, slot_monitoring_dirpath
+
+
+def delete_sessions(session_ids, reason):
+  core = client.CoreGrpcClient(address=sweep_spec.get("settings", {}).get("core_address", "localhost:50051"))
+  core.connect()
+
+  for session_id in session_ids:
+    try:
+      core.delete_session(session_id)
+      print(f"deleted {reason} session {session_id}")
+    except grpc.RpcError:
+      pass
+
+
+def delete_leftover_session(run_log):
+  # printed by run-dgs.py as soon as it has a session, so sessions of failed setups are found as well
+  session_ids = re.findall(r"^(?:created session|reusing warm session) (\d+)\b", run_log, re.MULTILINE)
+
+  if session_ids:
+    delete_sessions([int(session_ids[-1])], "leftover")
+
+
+def run_point(run_dirpath, settings, run_monitoring_dirpath):
+  run_dirpath.mkdir(parents=True, exist_ok=True)
+
+  config_filepath = run_dirpath / "config.json"
+  with open(config_filepath, "wt", encoding="utf8") as f:
+    json.dump({**settings, "interactive": False, "delete_session_at_end": True}, f, indent=2)
+
+  started = time.monotonic()
+  started_unix_time = time.time()
+
+  try:
+    result = subprocess.run(
+      [sys.executable, str(run_dgs_filepath), "--config", str(config_filepath), "--non-interactive"],
+      cwd=this_filepath,
+      stdout=subprocess.PIPE,
+      stderr=subprocess.STDOUT,
+      text=True,
+      timeout=run_timeout_seconds
+    )
+    run_log, succeeded = result.stdout, result.returncode == 0
+  except subprocess.TimeoutExpired as e:
+    partial_log = e.stdout.decode("utf8", errors="replace") if isinstance(e.stdout, bytes) else (e.stdout or "")
+    run_log, succeeded = partial_log + "\nkilled after timeout\n", False
+
+  with open(run_dirpath / "run-dgs.log", "wt", encoding="utf8") as f:
+    f.write(run_log)
+
+  if not succeeded:
+    delete_leftover_session(run_log)
+    return False
+
+  warm_session_ids.update(int(session_id) for session_id in re.findall(r"^reached end of simulation, keeping session (\d+) warm$", run_log, re.MULTILINE))
+
+  # only what this run wrote, the monitoring dir is shared by the runs of a slot and may hold files of runs with other settings
+  for monitoring_filepath in (filepath for filepath in run_monitoring_dirpath.glob("*.data") if filepath.stat().st_mtime >= started_unix_time):
+    shutil.copy2(monitoring_filepath, run_dirpath / monitoring_filepath.name)
+
+  (run_dirpath / "done").write_text(f"{time.monotonic() - started:.1f} seconds\n")
+  return True
+
+
+argument_parser = argparse.ArgumentParser(description="runs a parameter sweep of run-dgs.py back to back")
+argument_parser.add_argument("sweep_spec", type=pathlib.Path, help="json file describing the sweep")
+arguments = argument_parser.parse_args()
+
+with open(arguments.sweep_spec, "rt", encoding="utf8") as f:
+  sweep_spec = json.load(f)
+
+sweep_dirpath = archive_dirpath / sweep_spec["name"]
+repetitions = sweep_spec.get("repetitions", 1)
+runs = [(point_name, point, repetition) for point_name, point in get_points(sweep_spec) for repetition in range(1, repetitions + 1)]
+num_slots = min(sweep_spec.get("parallel_sessions", parallel_sessions), get_session_capacity())
+print(f"sweep '{sweep_spec['name']}': {len(runs)} runs into {sweep_dirpath}, {num_slots} at a time")
+
+free_slots = queue.Queue()
+for slot in range(num_slots):
+  free_slots.put(slot)
+
+failed_runs = []
+warm_session_ids = set()
+
+def run_in_slot(run_number, point_name, point, repetition):
+  run_dirpath = get_run_dirpath(point_name, repetition)
+  run_name = str(run_dirpath.relative_to(sweep_dirpath))
+
+  if (run_dirpath / "done").exists():
+    print(f"[{run_number}/{len(runs)}] {run_name} already done, skipping")
+    return
+
+  slot = free_slots.get()
+  try:
+    slot_settings, slot_monitoring_dirpath = get_slot_settings(slot, num_slots)
+    print(f"[{run_number}/{len(runs)}] running {run_name} in slot {slot}")
+
+    if run_point(run_dirpath, {**sweep_spec.get("settings", {}), **point, **slot_settings}, slot_monitoring_dirpath):
+      print(f"[{run_number}/{len(runs)}] {run_name} done")
+    else:
+      failed_runs.append(run_name)
+      print(f"[{run_number}/{len(runs)}] {run_name} failed, see {run_dirpath / 'run-dgs.log'}")
+  finally:
+    free_slots.put(slot)
+
+with ThreadPoolExecutor(max_workers=num_slots) as run_executor:
+  for future in [run_executor.submit(run_in_slot, run_number, *run) for run_number, run in enumerate(runs, 1)]:
+    future.result()
+
+delete_sessions(sorted(warm_session_ids), "warm")
+
+print(f"sweep finished, {len(runs) - len(failed_runs)} of {len(runs)} runs succeeded")
+if failed_runs:
+  print(f"failed runs: {', '.join(failed_runs)}")
+  sys.exit(1)
@@ -0,0 +1,58 @@
+"""
+drift-compensating real-time scheduler for replaying steps
+
+every step is due at an absolute time on the monotonic clock: t0 + scale * (step_time - origin_step_time)
+so the time spent executing a step is automatically subtracted from the wait before the next one and no drift accumulates
+a step that is already overdue is started immediately, its lateness is reported back
+fast_forward(seconds) moves every following step that much earlier, e.g. to compress a quiet stretch of the replay
+
+usage:
+ scheduler = StepScheduler(seconds_per_step_time=1.0, speedup=10.0, origin_step_time=0)
+ scheduler.start()
+ for step_time in ...:
+   lateness = scheduler.wait_for(step_time)
+   ...
+"""
+import time
+
+
+class StepScheduler:
+
+  def __init__(self, seconds_per_step_time: float, speedup: float = 1.0, origin_step_time: float = 0, clock=time.monotonic, sleep=time.sleep) -> None:
+    if speedup <= 0:
+      raise Exception(f"speedup must be positive, got {speedup}")
+
+    self.scale = seconds_per_step_time / speedup  # wall-clock seconds per unit of step time
+    self.origin_step_time = origin_step_time
+    self.clock = clock
+    self.sleep = sleep
+    self.t0 = None
+
+  def start(self) -> None:
+    self.t0 = self.clock()
+
+  def due_time(self, step_time: float) -> float:
+    return self.t0 + self.scale * (step_time - self.origin_step_time)
+
+  def time_until(self, step_time: float) -> float:
+    return self.due_time(step_time) - self.clock()
+
+  def fast_forward(self, seconds: float) -> None:
+    self.t0 -= seconds
+
+  def wait_for(self, step_time: float) -> float:
+    """
+    sleeps until the step is due
+
+    :return: lateness in seconds, e.g. how long after its due time the step starts (0 if it was on time)
+    """
+    if self.t0 is None:
+      self.start()
+
+    due_time = self.due_time(step_time)
+    remaining = due_time - self.clock()
+
+    if remaining > 0:
+      self.sleep(remaining)
+
+    return max(0.0, self.clock() - due_time)